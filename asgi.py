@@ -0,0 +1,98 @@
+"""
+Modo de servicio asíncrono (ASGI).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2
+
+El webhook /bot se atiende directamente en el event loop: el catálogo se lee
+de memoria y, si hace falta ir a Google Sheets, la llamada corre en un hilo
+con límite de concurrencia (utils.async_io). Con OpenAI activo la respuesta
+se arma en un hilo; solo las llamadas a la API se limitan con
+OPENAI_CONCURRENCY (pool de opneai_integrations). El resto de rutas se
+delegan a la aplicación Flask de bot.py.
+"""
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+
+from bot import app as flask_app, generar_respuesta, construir_twiml, responder_en_segundo_plano
+from config.settings import REPLY_MODE
+from utils.admission import admission
+from utils.metrics import metrics
+from utils.profiler import profiler
+from utils.startup import arranque
+from utils.utils_methods import get_catalog_async
+
+logger = logging.getLogger(__name__)
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def _leer_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def _responder(send, status: int, body: str, content_type: bytes = b"text/xml; charset=utf-8") -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type)],
+    })
+    await send({"type": "http.response.body", "body": body.encode("utf-8")})
+
+
+async def bot(scope, receive, send) -> None:
+    form = parse_qs((await _leer_body(receive)).decode("utf-8"), keep_blank_values=True)
+    incoming_msg = form.get("Body", [""])[0].strip()
+    user_number = form.get("From", [""])[0]
+
+    decision = admission.admitir(user_number, incoming_msg)
+    if not decision.admitido:
+        logger.info(f"Consulta no admitida de {user_number}: {incoming_msg}")
+        await _responder(send, 200, construir_twiml(decision.respuesta))
+        return
+
+    if REPLY_MODE == "async" and responder_en_segundo_plano(incoming_msg, user_number, form.get("To", [""])[0], decision):
+        logger.info(f"Consulta encolada de {user_number}: {incoming_msg}")
+        await _responder(send, 200, construir_twiml(None))
+        return
+
+    try:
+        with metrics.span("request"):
+            with metrics.span("catalog"):
+                catalog = await get_catalog_async()
+            # Siempre en un hilo: aun sin IA la búsqueda puede llamar a OpenAI (SEMANTIC_EMBEDDER=openai)
+            response = await asyncio.to_thread(generar_respuesta, catalog, incoming_msg, user_number)
+    finally:
+        admission.liberar(decision)
+    logger.info(f"Consulta recibida de {user_number}: {incoming_msg}")
+
+    await _responder(send, 200, construir_twiml(response))
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # El servidor acepta conexiones de inmediato; /readyz espera al calentamiento
+            arranque.iniciar()
+            profiler.iniciar()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send) -> None:
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == "/bot" and scope["method"] == "POST":
+        await bot(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
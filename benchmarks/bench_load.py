@@ -0,0 +1,143 @@
+"""
+Benchmark de carga del webhook contra una hoja de cálculo local.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_load [--models 100,1000,10000,100000]
+        [--requests 2000] [--concurrency 8] [--replay posts.jsonl]
+        [--sheets-latency-ms 0] [--budget-p99-ms 50]
+
+Para cada tamaño de catálogo genera modelos sintéticos, reemplaza gspread
+por benchmarks.fake_sheets y mide p50/p99 y peticiones por segundo de
+parse_user_message, buscar_celular y el POST /bot completo (Flask + TwiML).
+Con --replay se envían posts grabados (JSON por línea con Body y From) en
+lugar de los sintéticos. Con --budget-p99-ms el proceso termina con código 1
+si el p99 end-to-end supera el presupuesto.
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from benchmarks import fake_sheets
+
+fake_sheets.preparar_entorno()
+
+from bot import app  # noqa: E402
+from utils.message_parser import parse_user_message  # noqa: E402
+from utils.utils_methods import buscar_celular, get_catalog  # noqa: E402
+from config.settings import VALORES_WORKSHEET  # noqa: E402
+
+FINANCIERAS = ["krediya", "adelantos", "sumas pay", "addi", "banco de bogota", "brilla", "recompra", "contado"]
+
+
+def percentil(valores: List[float], q: float) -> float:
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def mensajes_sinteticos(modelos: List[str], n: int, seed: int = 11) -> List[Dict[str, str]]:
+    """
+    Mezcla consultas exactas, en minúsculas sin separadores, con errores de
+    tipeo, modelos inexistentes y respuestas numéricas a opciones pendientes.
+    """
+    rnd = random.Random(seed)
+    posts = []
+    for i in range(n):
+        modelo = rnd.choice(modelos)
+        tipo = rnd.random()
+        if tipo < 0.4:
+            consulta = modelo
+        elif tipo < 0.65:
+            consulta = modelo.lower().replace(" ", "", 2).replace("/", " ")
+        elif tipo < 0.8:
+            partes = modelo.split()
+            consulta = " ".join(partes[: max(2, len(partes) - 2)])
+        elif tipo < 0.9:
+            j = rnd.randrange(len(modelo))
+            consulta = modelo[:j] + modelo[j + 1:]
+        elif tipo < 0.95:
+            consulta = f"NOKIA {rnd.randrange(1000, 9999)}"
+        else:
+            consulta = str(rnd.randint(1, 5))
+        if not consulta.isdigit():
+            consulta = f"precios por {rnd.choice(FINANCIERAS)} de {consulta}"
+        posts.append({"Body": consulta, "From": f"whatsapp:+57300{i % 500:07d}"})
+    return posts
+
+
+def _medir(fn: Callable, items: List, concurrency: int = 1) -> Dict[str, float]:
+    latencias: List[float] = []
+
+    def _uno(item) -> None:
+        start = time.perf_counter()
+        fn(item)
+        latencias.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if concurrency <= 1:
+        for item in items:
+            _uno(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(_uno, items))
+    total = time.perf_counter() - start
+    return {
+        "p50_ms": percentil(latencias, 0.5) * 1000,
+        "p99_ms": percentil(latencias, 0.99) * 1000,
+        "rps": len(items) / total if total else 0.0,
+    }
+
+
+def _imprimir(nombre: str, r: Dict[str, float]) -> None:
+    print(f"  {nombre:<20} p50 {r['p50_ms']:8.3f} ms   p99 {r['p99_ms']:8.3f} ms   {r['rps']:10.0f} req/s")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default="100,1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--replay", default=None)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0.0)
+    parser.add_argument("--budget-p99-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    # El log por consulta se escribiría miles de veces y taparía el reporte
+    logging.getLogger().setLevel(logging.WARNING)
+    client = app.test_client()
+    excedido = False
+    for n in [int(x) for x in args.models.split(",")]:
+        start = time.perf_counter()
+        spreadsheet = fake_sheets.instalar(n, latency=args.sheets_latency_ms / 1000)
+        carga = time.perf_counter() - start
+        modelos = [row.celular for row in get_catalog().sheet(VALORES_WORKSHEET).rows]
+
+        if args.replay:
+            posts = fake_sheets.cargar_mensajes(args.replay)
+        else:
+            posts = mensajes_sinteticos(modelos, args.requests)
+        textos = [p["Body"] for p in posts]
+        consultas = [parse_user_message(t)[1] or t for t in textos]
+
+        print(f"Catálogo de {n} modelos (carga e indexado: {carga * 1000:.0f} ms)")
+        _imprimir("parse_user_message", _medir(parse_user_message, textos))
+        _imprimir("buscar_celular", _medir(lambda q: buscar_celular(get_catalog(), VALORES_WORKSHEET, q), consultas))
+        llamadas_antes = spreadsheet.calls
+        e2e = _medir(lambda p: client.post("/bot", data=p), posts, args.concurrency)
+        _imprimir(f"POST /bot (x{args.concurrency})", e2e)
+        print(f"  llamadas a Sheets durante el tráfico: {spreadsheet.calls - llamadas_antes}")
+
+        if args.budget_p99_ms is not None and e2e["p99_ms"] > args.budget_p99_ms:
+            print(f"  Presupuesto excedido: p99 {e2e['p99_ms']:.2f} ms > {args.budget_p99_ms:.2f} ms")
+            excedido = True
+
+    return 1 if excedido else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark de parse_user_message.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_parser [--iterations 20000] [--budget-us 50]
+
+Mide el costo por mensaje sin memoización (cada mensaje es nuevo) y con la
+caché de mensajes recientes caliente. Con --budget-us el proceso termina con
+código 1 si el costo sin caché supera el presupuesto. Antes de medir revisa
+que parse_batch_message separe bien los modelos de LOTES.
+"""
+import argparse
+import sys
+import time
+
+from utils import message_parser
+from utils.message_parser import parse_batch_message, parse_user_message
+
+MENSAJES = [
+    "precios por krediya de redmi A2 64gb 2gb",
+    "precio por sumas pay de samsung a35 128gb 6ram",
+    "info addi samsung a 15",
+    "consulta por banco de bogota del iphone 13",
+    "contado samsung a15 128gb 4ram",
+    "precios por re compra de moto g24",
+    "samsung a35 128gb",
+    "precios por adelanto para oppo a18",
+    "precios por brilla de motorola edge 40 256gb 8ram",
+    "precios para recompra de redmi note 13 pro",
+]
+
+# Consultas en lote y los modelos que deben salir (separadores dentro del nombre, prefijo heredado)
+LOTES = [
+    ("precios por addi de moto e 22 y moto g 24", ["MOTO E 22", "MOTO G 24"]),
+    ("precios por addi de vivo y 36 y a15", ["VIVO Y 36", "A15"]),
+    ("precios por addi de samsung a 15 y a 25 128gb", ["SAMSUNG A 15", "A 25 128GB"]),
+    ("precios por addi de iphone 13 y a15", ["IPHONE 13", "A15"]),
+    ("precios por krediya de iphone 13, 14 y 15 pro", ["IPHONE 13", "IPHONE 14", "IPHONE 15 PRO"]),
+    ("precios por brilla de samsung a15 128gb y 6ram y a25", ["SAMSUNG A15 128GB 6RAM", "A25"]),
+    ("precios por addi de moto e 22 y 32", ["MOTO E 22", "MOTO E 32"]),
+    ("precios por addi de oppo a18 y reno 11", ["OPPO A18", "RENO 11"]),
+]
+
+
+def _revisar_lotes() -> list:
+    errores = []
+    for mensaje, esperado in LOTES:
+        resultado = parse_batch_message(mensaje)
+        modelos = resultado[1] if resultado else None
+        if modelos != esperado:
+            errores.append(f"{mensaje!r}: {modelos} (esperado {esperado})")
+    return errores
+
+
+def _medir(iterations: int, cache: bool) -> float:
+    parse = message_parser._parse
+    start = time.perf_counter()
+    for i in range(iterations):
+        if not cache and hasattr(parse, "cache_clear"):
+            parse.cache_clear()
+        parse_user_message(MENSAJES[i % len(MENSAJES)])
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--budget-us", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    errores = _revisar_lotes()
+    if errores:
+        print("Consultas en lote mal separadas:")
+        print("\n".join(errores))
+        return 1
+
+    # Calentamiento
+    _medir(1000, cache=True)
+
+    frio = _medir(args.iterations, cache=False)
+    caliente = _medir(args.iterations, cache=True)
+    print(f"parse_user_message sin caché: {frio:.2f} µs/mensaje")
+    print(f"parse_user_message con caché: {caliente:.2f} µs/mensaje")
+
+    if args.budget_us is not None and frio > args.budget_us:
+        print(f"Presupuesto excedido: {frio:.2f} µs > {args.budget_us:.2f} µs")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
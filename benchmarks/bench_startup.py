@@ -0,0 +1,102 @@
+"""
+Benchmark de arranque en frío.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_startup [--runs 5] [--models 10000]
+        [--module bot] [--budget-ms 300]
+
+Cada corrida es un proceso nuevo con `python -X importtime`: se mide el
+tiempo de `import bot` (o --module), las dependencias más pesadas y qué SDKs
+opcionales se cargaron sin necesitarlos. Después se mide el tiempo hasta
+estar listo (import + calentamiento de utils.startup con un catálogo local
+de --models modelos). Con --budget-ms el proceso termina con código 1 si la
+mediana del import supera el presupuesto.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks import fake_sheets
+
+# SDKs que el webhook solo necesita según la configuración (se importan al primer uso)
+SDKS_DIFERIDOS = ["openai", "gspread", "google.oauth2", "twilio.rest", "twilio.twiml", "numpy"]
+
+_LISTO = """
+import time
+start = time.perf_counter()
+from benchmarks import fake_sheets
+import bot
+from utils.startup import arranque
+importado = time.perf_counter()
+fake_sheets.instalar({models}, refrescar=False)
+assert arranque.calentar()
+listo = time.perf_counter()
+print(importado - start, listo - start)
+"""
+
+
+def _entorno() -> Dict[str, str]:
+    fake_sheets.preparar_entorno()
+    return dict(os.environ)
+
+
+def _importtime(module: str, env: Dict[str, str]) -> List[Tuple[str, int]]:
+    # (módulo, microsegundos acumulados) de cada línea de -X importtime
+    proceso = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    modulos = []
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        modulos.append((nombre.rstrip(), int(acumulado)))
+    return modulos
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--models", type=int, default=10000)
+    parser.add_argument("--module", default="bot")
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+    env = _entorno()
+
+    totales = []
+    for _ in range(args.runs):
+        modulos = _importtime(args.module, env)
+        totales.append(next(us for nombre, us in modulos if nombre.strip() == args.module) / 1000)
+    mediana = statistics.median(totales)
+    print(f"import {args.module}: mediana {mediana:.1f} ms (min {min(totales):.1f}, max {max(totales):.1f})")
+
+    # Dependencias directas más pesadas de la última corrida
+    nivel = min(len(nombre) - len(nombre.lstrip()) for nombre, _ in modulos)
+    directas = [(nombre.strip(), us) for nombre, us in modulos if len(nombre) - len(nombre.lstrip()) == nivel + 2]
+    for nombre, us in sorted(directas, key=lambda item: -item[1])[:8]:
+        print(f"  {nombre:<32} {us / 1000:8.1f} ms")
+    cargados = {nombre.strip() for nombre, _ in modulos}
+    diferidos = [sdk for sdk in SDKS_DIFERIDOS if sdk in cargados]
+    print(f"  SDKs cargados al importar: {', '.join(diferidos) or 'ninguno'}")
+
+    listos = []
+    for _ in range(args.runs):
+        proceso = subprocess.run(
+            [sys.executable, "-c", _LISTO.format(models=args.models)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        listos.append(float(proceso.stdout.split()[1]) * 1000)
+    print(f"Hasta /readyz con {args.models} modelos: mediana {statistics.median(listos):.0f} ms")
+
+    if args.budget_ms is not None and mediana > args.budget_ms:
+        print(f"Presupuesto excedido: {mediana:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Hoja de cálculo local para benchmarks: reemplaza a gspread sin red.
+
+    from benchmarks.fake_sheets import preparar_entorno, instalar
+    preparar_entorno()              # antes de importar bot / utils
+    spreadsheet = instalar(10000)   # catálogo sintético de 10.000 modelos
+
+Los catálogos sintéticos usan nombres con el formato real de la hoja
+("SAMSUNG A 35 128GB/6RAM", "XIAOMI REDMI NOTE 13 PRO 256GB/8RAM") y precios
+con formato de moneda ("$1.234.000").
+"""
+import os
+import json
+import random
+import time
+from typing import Dict, List
+
+VALORES = "VALORES"
+RECOMPRA = "RECOMPRA"
+
+HEADERS = [
+    "CELULAR",
+    "CODIGO",
+    "VENTA",
+    "INICIAL FINANCIERA",
+    "INICIAL REAL",
+    "DESCUENTO",
+    "PRECIO BASE",
+    "PRECIO ADDI Y SUMAS",
+    "CONTADO",
+]
+
+# Marca y series con el rango de números de modelo de cada una
+SERIES = [
+    ("SAMSUNG", "A", range(5, 80, 5)),
+    ("SAMSUNG", "S", range(20, 26)),
+    ("SAMSUNG", "M", range(14, 56, 2)),
+    ("XIAOMI", "REDMI", range(9, 15)),
+    ("XIAOMI", "REDMI NOTE", range(10, 15)),
+    ("XIAOMI", "POCO X", range(3, 8)),
+    ("MOTOROLA", "MOTO G", range(14, 86, 2)),
+    ("MOTOROLA", "EDGE", range(30, 51, 10)),
+    ("OPPO", "A", range(17, 99)),
+    ("OPPO", "RENO", range(8, 13)),
+    ("HONOR", "X", range(5, 9)),
+    ("HONOR", "MAGIC", range(5, 7)),
+    ("REALME", "C", range(51, 68)),
+    ("VIVO", "Y", range(17, 37)),
+    ("TECNO", "SPARK", range(10, 21)),
+    ("INFINIX", "HOT", range(30, 51)),
+    ("IPHONE", "", range(11, 17)),
+]
+VARIANTES = ["", "PRO", "PLUS", "PRO+", "LITE", "5G", "ULTRA", "S", "PRIME", "NEO"]
+MEMORIAS = ["32GB/2RAM", "64GB/2RAM", "64GB/4RAM", "128GB/4RAM", "128GB/6RAM", "128GB/8RAM", "256GB/8RAM", "256GB/12RAM", "512GB/12RAM"]
+COLORES = ["", "NEGRO", "AZUL", "VERDE", "BLANCO", "GRIS", "MORADO", "DORADO", "PLATA", "ROSA", "CELESTE"]
+
+
+def _moneda(valor: int) -> str:
+    return "$" + f"{valor:,}".replace(",", ".")
+
+
+def nombres_modelos(n: int, seed: int = 7) -> List[str]:
+    """
+    n nombres de modelo únicos y deterministas para la misma semilla.
+    """
+    rnd = random.Random(seed)
+    nombres = []
+    vistos = set()
+    while len(nombres) < n:
+        marca, serie, numeros = rnd.choice(SERIES)
+        partes = [marca, serie, str(rnd.choice(numeros)), rnd.choice(VARIANTES), rnd.choice(MEMORIAS)]
+        if len(vistos) > 2000:
+            # Con catálogos grandes se agregan colores para que haya suficientes nombres distintos
+            partes.append(rnd.choice(COLORES))
+        nombre = " ".join(p for p in partes if p)
+        if nombre not in vistos:
+            vistos.add(nombre)
+            nombres.append(nombre)
+    return nombres
+
+
+def generar_catalogo(n: int, seed: int = 7) -> Dict[str, List[List[str]]]:
+    """
+    Valores de ambas hojas: VALORES con n modelos y RECOMPRA con una parte de ellos.
+    """
+    rnd = random.Random(seed)
+    valores = [HEADERS]
+    for i, nombre in enumerate(nombres_modelos(n, seed)):
+        venta = rnd.randrange(300, 6000) * 1000
+        valores.append([
+            nombre,
+            str(i + 1),
+            _moneda(venta),
+            _moneda(venta * rnd.choice([20, 25, 30, 40]) // 100),
+            _moneda(venta * rnd.choice([10, 15, 20]) // 100),
+            rnd.choice(["", "", "", "10%"]),
+            _moneda(venta * 85 // 100),
+            _moneda(venta * 7 // 100),
+            _moneda(venta * 95 // 100),
+        ])
+    recompra = [HEADERS[:-1]] + [row[:-1] for row in valores[1::3]]
+    return {VALORES: valores, RECOMPRA: recompra}
+
+
+class FakeSpreadsheet:
+    """
+    Implementa los métodos de gspread.Spreadsheet que usa utils.sheets_client.
+    `latency` simula el tiempo de ida y vuelta a Google por llamada.
+    """
+
+    def __init__(self, values: Dict[str, List[List[str]]], latency: float = 0.0):
+        self.values = values
+        self.latency = latency
+        self.calls = 0
+        self.updated = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+
+    def values_batch_get(self, ranges: List[str]) -> Dict:
+        self._llamada()
+        return {"valueRanges": [{"values": self.values.get(r.strip("'"), [])} for r in ranges]}
+
+    def values_get(self, range_name: str) -> Dict:
+        self._llamada()
+        return {"values": [[self.updated]]}
+
+    def get_lastUpdateTime(self) -> str:
+        self._llamada()
+        return self.updated
+
+    def _llamada(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def preparar_entorno() -> None:
+    """
+    Variables mínimas para importar la app sin credenciales ni archivos locales.
+    Debe llamarse antes de importar bot o utils.
+    """
+    os.environ.setdefault("SCOPES", "https://www.googleapis.com/auth/spreadsheets.readonly")
+    os.environ.setdefault("SPREADSHEET_NAME", "benchmark")
+    os.environ["VALORES_WORKSHEET"] = VALORES
+    os.environ["RECOMPRA_WORKSHEET"] = RECOMPRA
+    os.environ["CATALOG_SNAPSHOT_PATH"] = ""
+    os.environ["AI_CACHE_PATH"] = ""
+    os.environ["STATE_BACKEND"] = "memory"
+    os.environ.setdefault("AI_ENABLED", "false")
+    # El tráfico sintético repite números: sin control de admisión se mide el camino completo
+    os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+
+def instalar(n: int, latency: float = 0.0, seed: int = 7, refrescar: bool = True) -> FakeSpreadsheet:
+    """
+    Conecta un FakeSpreadsheet con n modelos al cliente global y recarga el
+    catálogo (con refrescar=False la carga queda para el calentamiento).
+    """
+    from utils.sheets_client import sheets_client
+    from utils.utils_methods import catalog_cache
+
+    spreadsheet = FakeSpreadsheet(generar_catalogo(n, seed), latency)
+    sheets_client._spreadsheet = spreadsheet
+    if refrescar:
+        catalog_cache.refresh(force=True)
+    return spreadsheet
+
+
+def cargar_mensajes(path: str) -> List[Dict[str, str]]:
+    """
+    Posts grabados de Twilio, uno por línea en JSON ({"Body": ..., "From": ...}).
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -1,17 +1,37 @@
+import hmac
 import logging
 import re
-from flask import Flask, request, session
-from twilio.twiml.messaging_response import MessagingResponse
-from config.settings import RECOMPRA_WORKSHEET, VALORES_WORKSHEET
+from typing import Optional
+from flask import Flask, Response, request, jsonify
+from config.settings import (
+    RECOMPRA_WORKSHEET,
+    VALORES_WORKSHEET,
+    AI_LATENCY_BUDGET_SECONDS,
+    CATALOG_REFRESH_TOKEN,
+    CATALOG_EXPORT_TOKEN,
+    PROFILER_TOKEN,
+    REPLY_MODE,
+)
 
 from utils.utils_methods import (
-    init_google_sheets,
-    buscar_celular,
-    format_currency,
-    procesar_krediya,
-    parse_user_message,
-    clean_currency,
+    get_catalog,
+    catalog_cache,
+    buscar_en_catalogo,
+    cotizar,
+    cotizar_lote,
 )
+from utils.catalog_export import FORMATOS, exportar, pagina_whatsapp
+from utils.conversation_state import conversation_store
+from opneai_integrations import interpretar_mensaje, mejorar_respuesta, openai_breaker
+from utils.message_parser import normalizar_financiera, parse_batch_message, parse_list_message, parser_cache_info
+from utils.metrics import metrics
+from utils.responses import lista_opciones, render
+from utils.profiler import profiler
+from utils.reply_delivery import reply_dispatcher, remitente
+from utils.admission import Decision, admission
+from utils.resilience import LatencyBudget
+from utils.sheets_client import sheets_client
+from utils.startup import arranque
 
 # Configuración de logging
 logging.basicConfig(
@@ -20,74 +40,43 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.secret_key = 'tu_clave_secreta_aqui'
 
-def procesar_recompra(data):
-    inicial_financiera = format_currency(data.get("INICIAL FINANCIERA", "N/A"))
-    inicial_real = format_currency(data.get("INICIAL REAL", "N/A"))
-    
-    try:
-        venta_valor = clean_currency(data.get("VENTA", 0))
-        inicial_financiera_valor = clean_currency(data.get("INICIAL FINANCIERA", 0))
-        porcentaje = (
-            round((inicial_financiera_valor / venta_valor) * 100)
-            if venta_valor != 0
-            else 0
-        )
-    except ZeroDivisionError:
-        porcentaje = 0
-    
-    response = (
-        f"📱 {data.get('CELULAR', 'N/A')}\n\n"
-        f"📊 Información para RECOMPRA 📊\n\n"
-        f"Precio de Venta: {format_currency(data.get('VENTA', 'N/A'))}\n"
-        f"Inicial Financiera ({porcentaje}%): {inicial_financiera}\n"
-        f"Inicial real: {inicial_real}"
-    )
-    return response
+def guardar_opciones(catalog, user_number: str, financiera: str, worksheet_name: str, options) -> None:
+    # Solo se guardan los ids de fila y la huella del contenido de la hoja (igual en todos los procesos)
+    conversation_store.set(user_number, {
+        "financiera": financiera,
+        "worksheet": worksheet_name,
+        "fingerprint": catalog.sheet(worksheet_name).fingerprint,
+        "row_ids": [option.row_id for option in options],
+    })
 
-def procesar_contado(data):
-    try:
-        precio_base = clean_currency(data.get("PRECIO BASE", 0))
-        VALOR_EXTRA = 180000
-        precio_contado = precio_base + VALOR_EXTRA
-        response = (
-            f"📱 {data.get('CELULAR', 'N/A')}\n\n"
-            f"💰 PRECIO DE CONTADO 💰\n\n"
-            f"💵 Total Contado: {format_currency(precio_contado)}"
-        )
-    except Exception as e:
-        logger.error(f"Error calculando precio contado: {e}")
-        response = "Error calculando el precio de contado"
-    return response
 
-def procesar_financiera_generica(data, financiera):
-    try:
-        precio_base = clean_currency(data.get("PRECIO BASE", 0))
-        precio_addi_sumas = clean_currency(data.get("PRECIO ADDI Y SUMAS", 0))
-        total = precio_base + precio_addi_sumas
+def opciones_vigentes(catalog, pending) -> bool:
+    # Los ids de fila solo valen si la hoja tiene el mismo contenido que cuando se guardaron
+    sheet = catalog.sheet(pending["worksheet"])
+    return sheet is not None and pending.get("fingerprint") == sheet.fingerprint
 
-        response = (
-            f"📱 {data.get('CELULAR', 'N/A')}\n\n"
-            f"📊 Información para {financiera.upper()} 📊\n\n"
-            f"💰 Total: {format_currency(total)}"
-        )
-    except Exception as e:
-        logger.error(f"Error calculando precio para {financiera}: {e}")
-        response = f"Error calculando el precio para {financiera}"
-    return response
 
-@app.route("/bot", methods=["POST"])
-def bot():
-    incoming_msg = request.values.get("Body", "").strip()
-    user_number = request.values.get("From", "")
-    resp = MessagingResponse()
-    msg = resp.message()
+def resolver_opcion(catalog, user_number: str, pending, incoming_msg: str):
+    # Resolución O(1): el número elegido apunta a un id de fila del snapshot
+    index = int(incoming_msg) - 1
+    sheet = catalog.sheet(pending["worksheet"])
+    if sheet is None or not 0 <= index < len(pending["row_ids"]):
+        return None
+
+    conversation_store.pop(user_number)
+    return cotizar(sheet, sheet.rows[pending["row_ids"][index]], pending["financiera"])
+
+
+def generar_respuesta(catalog, incoming_msg: str, user_number: str) -> str:
+    """
+    Arma el texto de respuesta para un mensaje. Las opciones pendientes de la
+    conversación se guardan en conversation_store por número de WhatsApp.
+    """
+    if not catalog:
+        return "Error de conexión con Google Sheets"
 
-    spreadsheet = init_google_sheets()
-    if not spreadsheet:
-        msg.body("Error de conexión con Google Sheets")
-        return str(resp)
+    budget = LatencyBudget(AI_LATENCY_BUDGET_SECONDS)
 
     if not incoming_msg or incoming_msg.lower() in ["hola", "hi", "hello", "buenos dias"]:
         welcome_msg = (
@@ -100,29 +89,29 @@ def bot():
             "Financieras disponibles:\n"
             "- Krediya\n- Adelantos\n- Sumas Pay\n- Addi\n- Banco de Bogotá\n- Brilla\n- Recompra\n- Contado"
         )
-        msg.body(welcome_msg)
-        return str(resp)
-
-    if incoming_msg.isdigit() and 'pending_options' in session:
-        selected = session['pending_options'].get(incoming_msg)
-        if selected:
-            financiera = session['pending_financiera']
-            session.pop('pending_options', None)
-            session.pop('pending_financiera', None)
-            
-            if financiera == "recompra":
-                response = procesar_recompra(selected)
-            elif financiera == "contado":
-                response = procesar_contado(selected)
-            elif financiera in ["krediya", "adelantos"]:
-                response = procesar_krediya(selected, financiera)
-            else:
-                response = procesar_financiera_generica(selected, financiera)
-            
-            msg.body(response)
-            return str(resp)
+        return welcome_msg
+
+    pending = conversation_store.get(user_number) if incoming_msg.isdigit() else None
+    if pending and not opciones_vigentes(catalog, pending):
+        conversation_store.pop(user_number)
+        return "Los precios se actualizaron. Por favor repite tu consulta para ver las opciones vigentes."
+
+    if pending:
+        response = resolver_opcion(catalog, user_number, pending, incoming_msg)
+        if response:
+            return response
+
+    lista = parse_list_message(incoming_msg)
+    if lista:
+        financiera, filtro, pagina = lista
+        return pagina_whatsapp(catalog, financiera, filtro, pagina)
 
-    financiera, modelo_celular = parse_user_message(incoming_msg)
+    lote = parse_batch_message(incoming_msg)
+    if lote:
+        financieras, modelos = lote
+        return cotizar_lote(catalog, financieras, modelos)
+
+    financiera, modelo_celular = interpretar_mensaje(incoming_msg, budget)
 
     if not modelo_celular:
         error_msg = (
@@ -132,8 +121,7 @@ def bot():
             "'precios por krediya de redmi A2 64gb 2gb'\n\n"
             "O simplemente escribe el modelo del celular que deseas consultar."
         )
-        msg.body(error_msg)
-        return str(resp)
+        return error_msg
 
     if not financiera:
         response = (
@@ -143,11 +131,12 @@ def bot():
             "Financieras disponibles:\n"
             "- Krediya\n- Adelantos\n- Sumas Pay\n- Addi\n- Banco de Bogotá\n- Brilla\n- Recompra\n- Contado"
         )
-        msg.body(response)
-        return str(resp)
+        return response
 
     worksheet_to_search = RECOMPRA_WORKSHEET if financiera == "recompra" else VALORES_WORKSHEET
-    data = buscar_celular(spreadsheet, worksheet_to_search, modelo_celular)
+    lookup = buscar_en_catalogo(catalog, worksheet_to_search, modelo_celular, budget)
+    data = lookup.primary
+    sheet = catalog.sheet(lookup.worksheet_name)
 
     if isinstance(data, dict) and "multiple_options" in data:
         options = data["multiple_options"]
@@ -155,62 +144,207 @@ def bot():
         # Si solo hay una opción (coincidencia exacta), mostrarla directamente
         if len(options) == 1:
             selected = options[0]
-            if financiera == "recompra":
-                response = procesar_recompra(selected)
-            elif financiera == "contado":
-                response = procesar_contado(selected)
-            elif financiera in ["krediya", "adelantos"]:
-                response = procesar_krediya(selected, financiera)
-            else:
-                response = procesar_financiera_generica(selected, financiera)
+            response = cotizar(sheet, selected, financiera)
+            response = mejorar_respuesta(response, incoming_msg, selected, budget)
         else:
-            response = f"📱 Encontramos opciones similares para {financiera.upper()}:\n\n"
-            for i, option in enumerate(options, 1):
-                celular = option.get("CELULAR", "Desconocido")
-                response += f"{i}. {celular}\n"
-            response += "\nPor favor responde con el número de la opción que deseas consultar."
-            session['pending_options'] = {str(i+1): opt for i, opt in enumerate(options)}
-            session['pending_financiera'] = financiera
+            response = render("opciones", financiera=financiera.upper(), opciones=lista_opciones(options))
+            guardar_opciones(catalog, user_number, financiera, lookup.worksheet_name, options)
     
     elif data:
-        if financiera == "recompra":
-            response = procesar_recompra(data)
-        elif financiera == "contado":
-            response = procesar_contado(data)
-        elif financiera in ["krediya", "adelantos"]:
-            response = procesar_krediya(data, financiera)
-        else:
-            response = procesar_financiera_generica(data, financiera)
+        response = cotizar(sheet, data, financiera)
+        response = mejorar_respuesta(response, incoming_msg, data, budget)
     else:
-        other_worksheet = VALORES_WORKSHEET if financiera == "recompra" else RECOMPRA_WORKSHEET
-        other_data = buscar_celular(spreadsheet, other_worksheet, modelo_celular)
+        other_data = lookup.cross
         
         if other_data:
             if isinstance(other_data, dict) and "multiple_options" in other_data:
                 options = other_data["multiple_options"]
-                response = f"No encontramos '{modelo_celular}' para {financiera.upper()}, pero tenemos:\n\n"
-                for i, option in enumerate(options[:3], 1):
-                    celular = option.get("CELULAR", "Desconocido")
-                    response += f"{i}. {celular}\n"
-                response += "\n¿Deseas consultar alguna de estas opciones?"
-                session['pending_options'] = {str(i): opt for i, opt in enumerate(options[:3], 1)}
-                session['pending_financiera'] = "recompra" if financiera != "recompra" else "valores"
+                response = render(
+                    "otra_hoja_opciones",
+                    modelo=modelo_celular,
+                    financiera=financiera.upper(),
+                    opciones=lista_opciones(options[:3]),
+                )
+                guardar_opciones(
+                    catalog,
+                    user_number,
+                    "recompra" if financiera != "recompra" else "valores",
+                    lookup.other_worksheet,
+                    options[:3],
+                )
             else:
-                response = f"No encontramos '{modelo_celular}' para {financiera.upper()}.\n\n"
-                response += f"Pero tenemos este modelo para {'RECOMPRA' if financiera != 'recompra' else 'otras financieras'}:\n"
-                response += f"📱 {other_data.get('CELULAR', 'N/A')}"
+                response = render(
+                    "otra_hoja",
+                    modelo=modelo_celular,
+                    financiera=financiera.upper(),
+                    otra="RECOMPRA" if financiera != "recompra" else "otras financieras",
+                    celular=other_data.celular,
+                )
         else:
-            response = f"No se encontró información para: {modelo_celular}\n\n"
-            response += "Sugerencias:\n"
-            response += "- Verifica la ortografía del modelo\n"
-            response += "- Intenta usar el formato completo (ej: SAMSUNG A 35 128GB)\n"
-            response += "- Consulta los modelos disponibles con 'lista de modelos'"
+            response = render("no_encontrado", modelo=modelo_celular)
+
+    return response
 
-    msg.body(response)
-    logger.info(f"Consulta recibida de {user_number}: {incoming_msg}")
 
+def construir_twiml(texto: Optional[str]) -> str:
+    # Sin texto se devuelve un <Response/> vacío: la respuesta llega por la API
+    from twilio.twiml.messaging_response import MessagingResponse
+
+    resp = MessagingResponse()
+    if texto is not None:
+        resp.message().body(texto)
     return str(resp)
 
+
+def responder_en_segundo_plano(incoming_msg: str, user_number: str, to_number: str, decision: Decision) -> bool:
+    """
+    Modo REPLY_MODE=async: la respuesta se arma y envía desde el pool de
+    reply_delivery. Devuelve False si la cola está llena.
+    """
+    def compute() -> str:
+        try:
+            with metrics.span("reply"):
+                return generar_respuesta(get_catalog(), incoming_msg, user_number)
+        finally:
+            admission.liberar(decision)
+
+    return reply_dispatcher.submit(user_number, remitente(to_number), compute)
+
+
+@app.route("/bot", methods=["POST"])
+def bot():
+    incoming_msg = request.values.get("Body", "").strip()
+    user_number = request.values.get("From", "")
+
+    decision = admission.admitir(user_number, incoming_msg)
+    if not decision.admitido:
+        logger.info(f"Consulta no admitida de {user_number}: {incoming_msg}")
+        return construir_twiml(decision.respuesta)
+
+    if REPLY_MODE == "async" and responder_en_segundo_plano(
+        incoming_msg, user_number, request.values.get("To", ""), decision
+    ):
+        logger.info(f"Consulta encolada de {user_number}: {incoming_msg}")
+        return construir_twiml(None)
+
+    try:
+        with metrics.span("request"):
+            with metrics.span("catalog"):
+                catalog = get_catalog()
+            response = generar_respuesta(catalog, incoming_msg, user_number)
+    finally:
+        admission.liberar(decision)
+    logger.info(f"Consulta recibida de {user_number}: {incoming_msg}")
+
+    return construir_twiml(response)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    snapshot = catalog_cache.peek()
+    return jsonify({
+        "sheets": sheets_client.health(),
+        "catalog_version": snapshot.version if snapshot else None,
+        "catalog_age": round(snapshot.age()) if snapshot else None,
+        "openai_circuit": openai_breaker.state,
+        "counters": metrics.counters(),
+        "latencies": metrics.latencies(),
+    })
+
+
+@app.route("/livez", methods=["GET"])
+def livez():
+    # El proceso está vivo aunque todavía esté calentando
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # Listo para recibir tráfico solo con el calentamiento terminado; el probe lo dispara si hace falta
+    arranque.iniciar()
+    return jsonify(arranque.estado()), 200 if arranque.listo() else 503
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # Formato de texto de Prometheus; los gauges se calculan al momento del scrape
+    snapshot = catalog_cache.peek()
+    if snapshot is not None:
+        metrics.gauge("catalog_version", snapshot.version)
+        metrics.gauge("catalog_age_seconds", round(snapshot.age(), 1))
+    metrics.gauge("openai_circuit_open", 0 if openai_breaker.state == "closed" else 1)
+    parser_cache = parser_cache_info()
+    if parser_cache is not None:
+        metrics.gauge("parser_cache_hits", parser_cache[0])
+        metrics.gauge("parser_cache_misses", parser_cache[1])
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/debug/profile", methods=["GET"])
+def debug_profile():
+    # Pilas del perfilador por muestreo (PROFILER_ENABLED); ?reset=1 empieza de cero
+    if not PROFILER_TOKEN:
+        return jsonify({"error": "perfilador sin token configurado"}), 404
+    if not _token_valido(PROFILER_TOKEN, "X-Profiler-Token"):
+        return jsonify({"error": "token inválido"}), 401
+    if not profiler.running:
+        return jsonify({"error": "perfilador desactivado"}), 404
+    body = profiler.collapsed()
+    if request.args.get("reset"):
+        profiler.reset()
+    return Response(body, mimetype="text/plain")
+
+
+def _token_valido(esperado: str, header: str = "X-Refresh-Token") -> bool:
+    token = request.headers.get(header, "")
+    authorization = request.headers.get("Authorization", "")
+    if not token and authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    return hmac.compare_digest(token.encode(), esperado.encode())
+
+
+@app.route("/catalog/refresh", methods=["POST"])
+def catalog_refresh():
+    # Webhook para que la hoja avise de un cambio (p. ej. trigger onEdit de Apps Script)
+    if not CATALOG_REFRESH_TOKEN:
+        return jsonify({"error": "refresco por push desactivado"}), 404
+    if not _token_valido(CATALOG_REFRESH_TOKEN):
+        return jsonify({"error": "token inválido"}), 401
+    catalog_cache.request_refresh()
+    snapshot = catalog_cache.peek()
+    return jsonify({
+        "accepted": True,
+        "catalog_version": snapshot.version if snapshot else None,
+    }), 202
+
+
+@app.route("/catalog/export", methods=["GET"])
+def catalog_export():
+    # Lista de precios completa por partes: ?financiera=addi&formato=csv|json|whatsapp&filtro=samsung
+    if not CATALOG_EXPORT_TOKEN:
+        return jsonify({"error": "exportación desactivada"}), 404
+    if not _token_valido(CATALOG_EXPORT_TOKEN, "X-Export-Token"):
+        return jsonify({"error": "token inválido"}), 401
+
+    formato = request.args.get("formato", "csv")
+    if formato not in FORMATOS:
+        return jsonify({"error": f"formato no soportado: {formato}"}), 400
+    financiera = None
+    if request.args.get("financiera"):
+        financiera = normalizar_financiera(request.args["financiera"])
+        if not financiera:
+            return jsonify({"error": "financiera desconocida"}), 400
+
+    catalog = get_catalog()
+    if not catalog:
+        return jsonify({"error": "catálogo no disponible"}), 503
+    metrics.inc("catalog_export_total", formato=formato)
+    # El generador conserva la referencia al snapshot: la exportación es consistente aunque se refresque
+    mimetype = {"csv": "text/csv", "json": "application/json", "whatsapp": "application/x-ndjson"}[formato]
+    return Response(exportar(catalog, financiera, formato, request.args.get("filtro", "")), mimetype=mimetype)
+
 if __name__ == "__main__":
+    arranque.iniciar()
+    profiler.iniciar()
     # app.run(debug=True, port=5000) # para desarrollo
     app.run(host='0.0.0.0', debug=False, port=5000) # para producción
\ No newline at end of file
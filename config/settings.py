@@ -1,18 +1,192 @@
 from dotenv import load_dotenv
 import os
+import importlib.util
+from typing import List, Sequence
 
 # Cargar variables de entorno
 load_dotenv()
 # Configuración de OpenAI desde variables de entorno
 # openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Valores inválidos encontrados al cargar la configuración: se usa el valor por
+# defecto y el problema se informa al arrancar y en GET /readyz
+ERRORES_CONFIGURACION: List[str] = []
+
+
+def _texto(nombre: str) -> str:
+    return os.getenv(nombre, "").strip()
+
+
+def _int(nombre: str, defecto: int) -> int:
+    valor = _texto(nombre)
+    if not valor:
+        return defecto
+    try:
+        return int(valor)
+    except ValueError:
+        ERRORES_CONFIGURACION.append(f"{nombre}={valor!r} no es un número entero; se usa {defecto}")
+        return defecto
+
+
+def _float(nombre: str, defecto: float) -> float:
+    valor = _texto(nombre)
+    if not valor:
+        return float(defecto)
+    try:
+        return float(valor)
+    except ValueError:
+        ERRORES_CONFIGURACION.append(f"{nombre}={valor!r} no es un número; se usa {defecto}")
+        return float(defecto)
+
+
+def _bool(nombre: str, defecto: bool) -> bool:
+    valor = _texto(nombre).lower()
+    if not valor:
+        return defecto
+    if valor in ("true", "1", "yes", "si"):
+        return True
+    if valor in ("false", "0", "no"):
+        return False
+    ERRORES_CONFIGURACION.append(f"{nombre}={valor!r} debe ser true o false; se usa {str(defecto).lower()}")
+    return defecto
+
+
+def _opcion(nombre: str, defecto: str, opciones: Sequence[str]) -> str:
+    valor = _texto(nombre).lower()
+    if not valor:
+        return defecto
+    if valor not in opciones:
+        ERRORES_CONFIGURACION.append(f"{nombre}={valor!r} debe ser uno de {', '.join(opciones)}; se usa {defecto}")
+        return defecto
+    return valor
+
+
 # Configuración de Google Sheets desde variables de entorno
 GOOGLE_SHEETS_CREDENTIALS = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
 SPREADSHEET_NAME = os.getenv("SPREADSHEET_NAME")
 VALORES_WORKSHEET = os.getenv("VALORES_WORKSHEET")
 RECOMPRA_WORKSHEET = os.getenv("RECOMPRA_WORKSHEET")
 
-# Configuración de alcance para Google Sheets
-SCOPES = os.getenv("SCOPES").split(",")
+# Alcance de las credenciales: solo lectura de Sheets y de los metadatos de Drive si no se indica
+SCOPES = [scope.strip() for scope in _texto("SCOPES").split(",") if scope.strip()] or [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.metadata.readonly",
+]
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Caché del catálogo en memoria (segundos)
+CATALOG_TTL_SECONDS = _float("CATALOG_TTL_SECONDS", 300)
+CATALOG_RETRY_SECONDS = _float("CATALOG_RETRY_SECONDS", 30)
+
+# Cantidad de mensajes normalizados que se memorizan en el parser (0 lo desactiva)
+PARSER_CACHE_SIZE = _int("PARSER_CACHE_SIZE", 1024)
+
+# Límite de llamadas simultáneas por servicio externo en el modo asíncrono
+SHEETS_CONCURRENCY = _int("SHEETS_CONCURRENCY", 4)
+OPENAI_CONCURRENCY = _int("OPENAI_CONCURRENCY", 8)
+
+# Cliente de Google Sheets
+SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
+SHEETS_POOL_SIZE = _int("SHEETS_POOL_SIZE", 10)
+SHEETS_TIMEOUT_SECONDS = _float("SHEETS_TIMEOUT_SECONDS", 10)
+SHEETS_TOKEN_REFRESH_MARGIN = _float("SHEETS_TOKEN_REFRESH_MARGIN", 300)
+
+# Caché de respuestas de OpenAI (AI_CACHE_PATH activa la persistencia en SQLite)
+AI_CACHE_SIZE = _int("AI_CACHE_SIZE", 2048)
+AI_CACHE_TTL_SECONDS = _float("AI_CACHE_TTL_SECONDS", 86400)
+AI_CACHE_PATH = os.getenv("AI_CACHE_PATH")
+
+# Uso de OpenAI en el webhook: presupuesto de latencia, timeouts y circuit breaker
+AI_ENABLED = _bool("AI_ENABLED", False)
+AI_ENHANCE_RESPONSES = _bool("AI_ENHANCE_RESPONSES", True)
+AI_LATENCY_BUDGET_SECONDS = _float("AI_LATENCY_BUDGET_SECONDS", 10)
+AI_CALL_TIMEOUT_SECONDS = _float("AI_CALL_TIMEOUT_SECONDS", 4)
+AI_SLOW_CALL_SECONDS = _float("AI_SLOW_CALL_SECONDS", 3)
+AI_BREAKER_FAILURES = _int("AI_BREAKER_FAILURES", 5)
+AI_BREAKER_RESET_SECONDS = _float("AI_BREAKER_RESET_SECONDS", 60)
+
+# Estado de conversación (opciones pendientes por número): memory, sqlite o redis
+STATE_BACKEND = _opcion("STATE_BACKEND", "memory", ("memory", "sqlite", "redis"))
+STATE_TTL_SECONDS = _float("STATE_TTL_SECONDS", 900)
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "conversation_state.db")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://localhost:6379/0")
+
+# Detección de cambios del catálogo: drive (modifiedTime), cell (CATALOG_VERSION_RANGE) o none
+CATALOG_CHANGE_SIGNAL = _opcion("CATALOG_CHANGE_SIGNAL", "drive", ("drive", "cell", "none"))
+CATALOG_VERSION_RANGE = os.getenv("CATALOG_VERSION_RANGE")
+# Token compartido para POST /catalog/refresh (sin token el endpoint queda desactivado)
+CATALOG_REFRESH_TOKEN = os.getenv("CATALOG_REFRESH_TOKEN")
+# Token para GET /catalog/export (sin token el endpoint queda desactivado)
+CATALOG_EXPORT_TOKEN = os.getenv("CATALOG_EXPORT_TOKEN")
+
+# Copia local del último catálogo bueno, cargada al arrancar (vacío la desactiva)
+CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "catalog_snapshot.bin")
+
+# Con varios workers: cada cuánto revisan si el refrescador publicó un catálogo nuevo
+CATALOG_WATCH_SECONDS = _float("CATALOG_WATCH_SECONDS", 1)
+
+# Perfilador por muestreo (GET /debug/profile); se puede dejar activo en producción
+PROFILER_ENABLED = _bool("PROFILER_ENABLED", False)
+PROFILER_INTERVAL_SECONDS = _float("PROFILER_INTERVAL_SECONDS", 0.01)
+# Token propio de GET /debug/profile; vacío deja el endpoint desactivado
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+
+# Reglas de precios por financiera en JSON (vacío usa las reglas por defecto)
+PRICING_RULES_PATH = os.getenv("PRICING_RULES_PATH")
+
+# Entrega de respuestas: sync (TwiML en el webhook) o async (API REST de Twilio en segundo plano)
+REPLY_MODE = _opcion("REPLY_MODE", "sync", ("sync", "async"))
+REPLY_SENDER = _opcion("REPLY_SENDER", "twilio", ("twilio", "fake"))
+REPLY_WORKERS = _int("REPLY_WORKERS", 4)
+REPLY_QUEUE_SIZE = _int("REPLY_QUEUE_SIZE", 1000)
+REPLY_MAX_RETRIES = _int("REPLY_MAX_RETRIES", 3)
+REPLY_BACKOFF_SECONDS = _float("REPLY_BACKOFF_SECONDS", 0.5)
+REPLY_TIMEOUT_SECONDS = _float("REPLY_TIMEOUT_SECONDS", 10)
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_WHATSAPP_FROM = os.getenv("TWILIO_WHATSAPP_FROM")
+
+# Control de admisión del webhook (por proceso)
+ADMISSION_ENABLED = _bool("ADMISSION_ENABLED", True)
+ADMISSION_SENDER_RATE = _float("ADMISSION_SENDER_RATE", 0.5)
+ADMISSION_SENDER_BURST = _float("ADMISSION_SENDER_BURST", 5)
+ADMISSION_SENDER_CONCURRENCY = _int("ADMISSION_SENDER_CONCURRENCY", 2)
+ADMISSION_GLOBAL_RATE = _float("ADMISSION_GLOBAL_RATE", 100)
+ADMISSION_GLOBAL_BURST = _float("ADMISSION_GLOBAL_BURST", 200)
+ADMISSION_MAX_INFLIGHT = _int("ADMISSION_MAX_INFLIGHT", 64)
+ADMISSION_DUPLICATE_SECONDS = _float("ADMISSION_DUPLICATE_SECONDS", 5)
+
+# Búsqueda semántica de modelos (requiere numpy): embedder ngram (local) u openai
+SEMANTIC_SEARCH = _bool("SEMANTIC_SEARCH", False)
+SEMANTIC_EMBEDDER = _opcion("SEMANTIC_EMBEDDER", "ngram", ("ngram", "openai"))
+SEMANTIC_DIMENSIONS = _int("SEMANTIC_DIMENSIONS", 1024)
+SEMANTIC_MIN_SCORE = _float("SEMANTIC_MIN_SCORE", 0.5)
+SEMANTIC_OPENAI_MODEL = os.getenv("SEMANTIC_OPENAI_MODEL", "text-embedding-3-small")
+# Sin numpy instalado se desactiva en lugar de fallar al cargar el catálogo
+if SEMANTIC_SEARCH and importlib.util.find_spec("numpy") is None:
+    ERRORES_CONFIGURACION.append("SEMANTIC_SEARCH=true requiere numpy (pip install numpy); se desactiva")
+    SEMANTIC_SEARCH = False
+
+
+def validar_configuracion() -> List[str]:
+    """
+    Problemas de la configuración que impiden atender bien las consultas:
+    valores inválidos y combinaciones incompletas. Se llama al arrancar.
+    """
+    problemas = list(ERRORES_CONFIGURACION)
+    if not GOOGLE_SHEETS_CREDENTIALS:
+        problemas.append("Falta GOOGLE_SHEETS_CREDENTIALS")
+    elif not os.path.exists(GOOGLE_SHEETS_CREDENTIALS):
+        problemas.append(f"No existe el archivo de credenciales {GOOGLE_SHEETS_CREDENTIALS}")
+    if not (SPREADSHEET_NAME or SPREADSHEET_ID):
+        problemas.append("Falta SPREADSHEET_NAME o SPREADSHEET_ID")
+    if not (VALORES_WORKSHEET and RECOMPRA_WORKSHEET):
+        problemas.append("Faltan VALORES_WORKSHEET y/o RECOMPRA_WORKSHEET")
+    if CATALOG_CHANGE_SIGNAL == "cell" and not CATALOG_VERSION_RANGE:
+        problemas.append("CATALOG_CHANGE_SIGNAL=cell requiere CATALOG_VERSION_RANGE")
+    if (AI_ENABLED or SEMANTIC_EMBEDDER == "openai") and not OPENAI_API_KEY:
+        problemas.append("Falta OPENAI_API_KEY (AI_ENABLED o SEMANTIC_EMBEDDER=openai)")
+    if REPLY_MODE == "async" and REPLY_SENDER == "twilio" and not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN):
+        problemas.append("REPLY_MODE=async requiere TWILIO_ACCOUNT_SID y TWILIO_AUTH_TOKEN")
+    return problemas
@@ -0,0 +1,59 @@
+"""
+Modo multi-worker (pre-fork):
+
+    gunicorn -c gunicorn.conf.py bot:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+El master importa la aplicación una sola vez (preload_app), carga el catálogo
+y es el único que refresca desde Google Sheets; cada versión nueva se publica
+de forma atómica en CATALOG_SNAPSHOT_PATH. Los workers heredan el catálogo por
+copy-on-write y solo recargan la copia publicada cuando cambia.
+
+Los hilos del master (refrescador, renovación del token, perfilador) no pasan
+al worker, pero los locks que tenían tomados sí: cada módulo con estado de
+proceso registra su reinicio con os.register_at_fork(after_in_child=...), así
+que cualquier fork (gunicorn o no) parte de locks libres y sin hilos heredados.
+"""
+import gc
+import os
+import logging
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+preload_app = True
+
+
+def when_ready(server):
+    from config.settings import CATALOG_SNAPSHOT_PATH
+    from utils.conversation_state import MemoryStateStore, conversation_store
+    from utils.startup import arranque
+    from utils.utils_methods import catalog_cache
+
+    # Con estado en memoria la respuesta "1", "2"... puede llegar a otro worker que no guardó las opciones
+    if server.num_workers > 1 and isinstance(conversation_store, MemoryStateStore):
+        raise RuntimeError(
+            f"STATE_BACKEND=memory no sirve con {server.num_workers} workers: "
+            "usa STATE_BACKEND=sqlite o redis, o WEB_CONCURRENCY=1"
+        )
+
+    # Calentamiento en el master, antes de crear los workers: nacen listos
+    arranque.calentar()
+    if not CATALOG_SNAPSHOT_PATH:
+        logger.warning("CATALOG_SNAPSHOT_PATH vacío: cada worker descargará su propio catálogo")
+        return
+    catalog_cache.lead()
+    # Los objetos ya creados no los recorre el GC, así los workers no tocan sus páginas
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from config.settings import CATALOG_SNAPSHOT_PATH
+    from utils.profiler import profiler
+    from utils.utils_methods import catalog_cache
+
+    # El hilo del perfilador tiene que vivir en el worker, no en el master
+    profiler.iniciar()
+    if CATALOG_SNAPSHOT_PATH:
+        catalog_cache.follow()
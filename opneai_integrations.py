@@ -1,7 +1,24 @@
-import openai
+import os
+import json
+import time
 import logging
-from config.settings import OPENAI_API_KEY
-from typing import Optional, Dict, List
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config.settings import (
+    OPENAI_API_KEY,
+    OPENAI_CONCURRENCY,
+    AI_ENABLED,
+    AI_ENHANCE_RESPONSES,
+    AI_CALL_TIMEOUT_SECONDS,
+    AI_SLOW_CALL_SECONDS,
+    AI_BREAKER_FAILURES,
+    AI_BREAKER_RESET_SECONDS,
+    SEMANTIC_SEARCH,
+)
+from typing import Optional, Dict, List, Tuple
+from utils.ai_cache import cached_ai_call
+from utils.message_parser import parse_user_message, normalizar_financiera
+from utils.metrics import metrics
+from utils.resilience import CircuitBreaker, CircuitOpenError, BudgetExhaustedError, LatencyBudget
 
 # Configuración de logging
 logging.basicConfig(
@@ -9,124 +26,271 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Configurar la API de OpenAI
-openai.api_key = OPENAI_API_KEY
+_openai = None
+
 
-def analyze_user_query(query: str, context: str = "") -> Dict:
+def cliente_openai():
     """
-    Analiza la consulta del usuario usando OpenAI para extraer intención y parámetros.
+    SDK de OpenAI, importado al primer uso: cuesta unos 250 ms de arranque y
+    con AI_ENABLED=false nunca se necesita.
     """
-    try:
-        prompt = f"""
-        Eres un asistente especializado en consultas sobre precios de celulares y financieras.
-        Analiza la siguiente consulta del usuario y extrae:
-        1. La financiera solicitada (krediya, adelantos, sumas pay, addi, banco de bogotá, brilla, recompra, contado)
-        2. El modelo exacto del celular (incluyendo capacidad de almacenamiento y RAM si se menciona)
-        3. La intención principal (consultar precio, comparar, etc.)
-
-        Contexto: {context}
-        Consulta: "{query}"
-
-        Devuelve la respuesta en formato JSON con las claves: financiera, modelo, intencion.
-        Si no se puede determinar algún valor, usa null.
-        """
-        
-        response = openai.ChatCompletion.create(
+    global _openai
+    if _openai is None:
+        import openai
+
+        # Configurar la API de OpenAI
+        openai.api_key = OPENAI_API_KEY
+        _openai = openai
+    return _openai
+
+ANALISIS_VACIO = {"financiera": None, "modelo": None, "intencion": None}
+
+# Se deja de llamar a OpenAI tras varios fallos o respuestas lentas seguidas
+openai_breaker = CircuitBreaker(
+    "openai", AI_BREAKER_FAILURES, AI_SLOW_CALL_SECONDS, AI_BREAKER_RESET_SECONDS
+)
+
+# Hilos para poder cortar la llamada síncrona al vencer el timeout
+_executor = ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY, thread_name_prefix="openai")
+
+
+def _reiniciar_tras_fork() -> None:
+    # Los hilos del pool del padre no existen en el hijo: un pool nuevo los crea al primer uso
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY, thread_name_prefix="openai")
+    openai_breaker.reiniciar_tras_fork()
+
+
+os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+
+@cached_ai_call("chat", ignore=("timeout",))
+def _chat(messages: List[Dict], temperature: float, max_tokens: int, timeout: float = AI_CALL_TIMEOUT_SECONDS) -> str:
+    openai_breaker.check()
+    # Para el breaker y la latencia solo cuenta la llamada a OpenAI, no la espera en la cola del pool
+    inicio: Dict[str, float] = {}
+
+    def llamar():
+        inicio["t"] = time.monotonic()
+        return cliente_openai().ChatCompletion.create(
             model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asistente especializado en análisis de consultas sobre precios de celulares."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=150
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            request_timeout=timeout,
         )
-        
-        # Extraer y parsear la respuesta JSON
-        import json
-        try:
-            result = json.loads(response.choices[0].message.content)
-            return result
-        except json.JSONDecodeError:
-            logger.error("Error al parsear la respuesta de OpenAI")
-            return {"financiera": None, "modelo": None, "intencion": None}
-            
+
+    # Tras check() todo camino registra o libera: si no, la llamada de prueba quedaría tomada
+    try:
+        future = _executor.submit(llamar)
+        response = future.result(timeout=timeout)
+    except FutureTimeoutError:
+        if future.cancel():
+            # Seguía en la cola (pool saturado): no se envía ni gasta tokens después del fallback
+            openai_breaker.release()
+            metrics.inc("openai_queue_timeout_total")
+            raise TimeoutError(f"Sin turno para llamar a OpenAI en {timeout:.1f}s")
+        openai_breaker.record(time.monotonic() - inicio.get("t", time.monotonic()), ok=False)
+        raise TimeoutError(f"OpenAI no respondió en {timeout:.1f}s")
+    except Exception:
+        if "t" in inicio:
+            openai_breaker.record(time.monotonic() - inicio["t"], ok=False)
+        else:
+            openai_breaker.release()
+        raise
+    openai_breaker.record(time.monotonic() - inicio["t"])
+    return response.choices[0].message.content
+
+
+def _mensajes_analisis(query: str, context: str) -> List[Dict]:
+    prompt = f"""
+    Eres un asistente especializado en consultas sobre precios de celulares y financieras.
+    Analiza la siguiente consulta del usuario y extrae:
+    1. La financiera solicitada (krediya, adelantos, sumas pay, addi, banco de bogotá, brilla, recompra, contado)
+    2. El modelo exacto del celular (incluyendo capacidad de almacenamiento y RAM si se menciona)
+    3. La intención principal (consultar precio, comparar, etc.)
+
+    Contexto: {context}
+    Consulta: "{query}"
+
+    Devuelve la respuesta en formato JSON con las claves: financiera, modelo, intencion.
+    Si no se puede determinar algún valor, usa null.
+    """
+    return [
+        {"role": "system", "content": "Eres un asistente especializado en análisis de consultas sobre precios de celulares."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _parsear_analisis(content: str) -> Dict:
+    # Extraer y parsear la respuesta JSON
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        logger.error("Error al parsear la respuesta de OpenAI")
+        return dict(ANALISIS_VACIO)
+
+
+def analyze_user_query(query: str, context: str = "", timeout: float = AI_CALL_TIMEOUT_SECONDS) -> Dict:
+    """
+    Analiza la consulta del usuario usando OpenAI para extraer intención y parámetros.
+    """
+    try:
+        content = _chat(_mensajes_analisis(query, context), temperature=0.3, max_tokens=150, timeout=timeout)
+        return _parsear_analisis(content)
     except Exception as e:
         logger.error(f"Error en OpenAI API: {e}")
-        return {"financiera": None, "modelo": None, "intencion": None}
+        return dict(ANALISIS_VACIO)
+
 
-def enhance_response_with_ai(original_response: str, user_query: str, data: Dict) -> str:
+def _mensajes_mejora(original_response: str, user_query: str, data: Dict) -> List[Dict]:
+    prompt = f"""
+    Eres un asistente de ventas de celulares. El usuario preguntó: "{user_query}".
+
+    Esta es la información que encontramos en la hoja de cálculo:
+    {data}
+
+    Esta fue la respuesta original que planeábamos enviar:
+    "{original_response}"
+
+    Mejora esta respuesta para que sea más natural, útil y persuasiva, manteniendo toda la información técnica.
+    Incluye recomendaciones relevantes si es apropiado.
+    Responde en el mismo idioma que la consulta del usuario.
+    """
+    return [
+        {"role": "system", "content": "Eres un asistente de ventas especializado en celulares y planes de financiación."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def enhance_response_with_ai(original_response: str, user_query: str, data: Dict, timeout: float = AI_CALL_TIMEOUT_SECONDS) -> str:
     """
     Mejora la respuesta original con información contextual usando OpenAI.
     """
     try:
-        prompt = f"""
-        Eres un asistente de ventas de celulares. El usuario preguntó: "{user_query}".
-        
-        Esta es la información que encontramos en la hoja de cálculo:
-        {data}
-        
-        Esta fue la respuesta original que planeábamos enviar:
-        "{original_response}"
-        
-        Mejora esta respuesta para que sea más natural, útil y persuasiva, manteniendo toda la información técnica.
-        Incluye recomendaciones relevantes si es apropiado.
-        Responde en el mismo idioma que la consulta del usuario.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asistente de ventas especializado en celulares y planes de financiación."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5,
-            max_tokens=300
-        )
-        
-        return response.choices[0].message.content
-        
+        return _chat(_mensajes_mejora(original_response, user_query, data), temperature=0.5, max_tokens=300, timeout=timeout)
     except Exception as e:
         logger.error(f"Error al mejorar respuesta con OpenAI: {e}")
         return original_response
 
-def suggest_alternatives(user_query: str, available_options: List[Dict]) -> str:
+
+def _listar_opciones(available_options: List[Dict]) -> str:
+    return "\n".join([f"{i+1}. {opt.get('CELULAR', 'Desconocido')}" for i, opt in enumerate(available_options)])
+
+
+def _mensajes_alternativas(user_query: str, options_str: str) -> List[Dict]:
+    prompt = f"""
+    El usuario buscó: "{user_query}" pero no encontramos una coincidencia exacta.
+
+    Estas son las opciones disponibles que podrían interesarle:
+    {options_str}
+
+    Genera un mensaje amigable que:
+    1. Explique que no encontramos exactamente lo que buscaba
+    2. Presente las opciones disponibles de manera clara
+    3. Sugiera cuál podría ser la mejor opción basada en la consulta del usuario
+    4. Pida al usuario que seleccione una opción o reformule su búsqueda
+
+    El mensaje debe ser conciso (máximo 3 párrafos) y en el mismo idioma de la consulta.
+    """
+    return [
+        {"role": "system", "content": "Eres un asistente de ventas especializado en celulares."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _alternativas_por_defecto(options_str: str) -> str:
+    # Respuesta por defecto si falla OpenAI
+    default_response = "📱 Encontramos varias opciones similares:\n\n"
+    default_response += options_str
+    default_response += "\n\nPor favor responde con el número de la opción que deseas consultar."
+    return default_response
+
+
+def suggest_alternatives(user_query: str, available_options: List[Dict], timeout: float = AI_CALL_TIMEOUT_SECONDS) -> str:
     """
     Sugiere alternativas relevantes usando OpenAI cuando no se encuentra exactamente lo que busca el usuario.
     """
+    options_str = _listar_opciones(available_options)
     try:
-        options_str = "\n".join([f"{i+1}. {opt.get('CELULAR', 'Desconocido')}" for i, opt in enumerate(available_options)])
-        
-        prompt = f"""
-        El usuario buscó: "{user_query}" pero no encontramos una coincidencia exacta.
-        
-        Estas son las opciones disponibles que podrían interesarle:
-        {options_str}
-        
-        Genera un mensaje amigable que:
-        1. Explique que no encontramos exactamente lo que buscaba
-        2. Presente las opciones disponibles de manera clara
-        3. Sugiera cuál podría ser la mejor opción basada en la consulta del usuario
-        4. Pida al usuario que seleccione una opción o reformule su búsqueda
-        
-        El mensaje debe ser conciso (máximo 3 párrafos) y en el mismo idioma de la consulta.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asistente de ventas especializado en celulares."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.6,
-            max_tokens=350
-        )
-        
-        return response.choices[0].message.content
-        
+        return _chat(_mensajes_alternativas(user_query, options_str), temperature=0.6, max_tokens=350, timeout=timeout)
     except Exception as e:
         logger.error(f"Error al generar sugerencias con OpenAI: {e}")
-        # Respuesta por defecto si falla OpenAI
-        default_response = "📱 Encontramos varias opciones similares:\n\n"
-        default_response += options_str
-        default_response += "\n\nPor favor responde con el número de la opción que deseas consultar."
-        return default_response
\ No newline at end of file
+        return _alternativas_por_defecto(options_str)
+
+
+def _motivo_fallback(error: Exception) -> str:
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(error, BudgetExhaustedError):
+        return "budget"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    return "error"
+
+
+def interpretar_mensaje(message: str, budget: LatencyBudget) -> Tuple[Optional[str], str]:
+    """
+    Extrae (financiera, modelo) con OpenAI dentro del presupuesto de latencia.
+    Si la IA está desactivada, el circuito abierto, se agota el tiempo o no
+    devuelve un modelo, se usa el resultado de parse_user_message(). Con
+    SEMANTIC_SEARCH solo se llama a OpenAI si el parser no encontró la financiera.
+    """
+    with metrics.span("parse"):
+        financiera, modelo = parse_user_message(message)
+    if not AI_ENABLED:
+        return financiera, modelo
+    if SEMANTIC_SEARCH and financiera and modelo:
+        # El modelo en texto libre lo resuelve la búsqueda semántica sin ir a OpenAI
+        metrics.inc("ai_path_total", stage="parse", path="fallback", reason="semantic")
+        return financiera, modelo
+
+    try:
+        with metrics.span("ai_parse"):
+            content = _chat(
+                _mensajes_analisis(message, ""),
+                temperature=0.3,
+                max_tokens=150,
+                timeout=budget.timeout_for(AI_CALL_TIMEOUT_SECONDS),
+            )
+        analisis = json.loads(content)
+        modelo_ai = str(analisis.get("modelo") or "").upper().strip()
+        financiera_ai = normalizar_financiera(str(analisis.get("financiera") or ""))
+    except Exception as e:
+        motivo = _motivo_fallback(e)
+        logger.warning(f"Análisis con OpenAI omitido ({motivo}): {e}")
+        metrics.inc("ai_path_total", stage="parse", path="fallback", reason=motivo)
+        return financiera, modelo
+
+    if not modelo_ai:
+        metrics.inc("ai_path_total", stage="parse", path="fallback", reason="empty")
+        return financiera_ai or financiera, modelo
+
+    metrics.inc("ai_path_total", stage="parse", path="ai")
+    return financiera_ai or financiera, modelo_ai
+
+
+def mejorar_respuesta(response: str, user_query: str, data, budget: LatencyBudget) -> str:
+    """
+    Mejora la respuesta con OpenAI si queda presupuesto; si no, devuelve la
+    respuesta de las plantillas de precios tal cual.
+    """
+    if not (AI_ENABLED and AI_ENHANCE_RESPONSES):
+        return response
+
+    try:
+        with metrics.span("ai_enhance"):
+            improved = _chat(
+                _mensajes_mejora(response, user_query, data),
+                temperature=0.5,
+                max_tokens=300,
+                timeout=budget.timeout_for(AI_CALL_TIMEOUT_SECONDS),
+            )
+    except Exception as e:
+        motivo = _motivo_fallback(e)
+        logger.warning(f"Mejora con OpenAI omitida ({motivo}): {e}")
+        metrics.inc("ai_path_total", stage="enhance", path="fallback", reason=motivo)
+        return response
+
+    metrics.inc("ai_path_total", stage="enhance", path="ai")
+    return improved
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+from config.settings import (
+    ADMISSION_ENABLED,
+    ADMISSION_SENDER_RATE,
+    ADMISSION_SENDER_BURST,
+    ADMISSION_SENDER_CONCURRENCY,
+    ADMISSION_GLOBAL_RATE,
+    ADMISSION_GLOBAL_BURST,
+    ADMISSION_MAX_INFLIGHT,
+    ADMISSION_DUPLICATE_SECONDS,
+)
+from utils.metrics import metrics
+
+_ESPACIOS = re.compile(r"\s+")
+
+MENSAJE_LIMITE = "Estás enviando muchos mensajes seguidos. Espera unos segundos y vuelve a escribir tu consulta."
+MENSAJE_SATURADO = "Estamos atendiendo muchas consultas en este momento. Por favor intenta de nuevo en un minuto."
+
+# Máximo de números de WhatsApp con estado en memoria
+MAX_SENDERS = 10000
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens: admite ráfagas de `burst` y en promedio `rate` por segundo.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _EstadoRemitente:
+    __slots__ = ("bucket", "inflight", "last_key", "last_time", "notified_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.inflight = 0
+        self.last_key = None
+        self.last_time = 0.0
+        self.notified_until = 0.0
+
+
+class Decision:
+    """
+    Resultado de admitir un mensaje. Si `admitido` es False, `respuesta` es el
+    texto enlatado a devolver (None para no responder nada).
+    """
+
+    __slots__ = ("admitido", "respuesta", "sender")
+
+    def __init__(self, admitido: bool, respuesta: Optional[str] = None, sender: Optional[str] = None):
+        self.admitido = admitido
+        self.respuesta = respuesta
+        self.sender = sender
+
+
+class AdmissionController:
+    """
+    Control de admisión del webhook, antes de tocar el catálogo u OpenAI:
+
+    - mensajes repetidos del mismo número dentro de `duplicate_window` se
+      descartan (la primera respuesta ya va en camino);
+    - cubeta de tokens y tope de consultas en curso por número, para que un
+      chat saturado no afecte a los demás;
+    - cubeta global y tope de consultas en curso (incluye las encoladas en
+      modo async); al superarlos se responde un mensaje enlatado.
+
+    Los límites son por proceso.
+    """
+
+    def __init__(
+        self,
+        sender_rate: float = ADMISSION_SENDER_RATE,
+        sender_burst: float = ADMISSION_SENDER_BURST,
+        sender_concurrency: int = ADMISSION_SENDER_CONCURRENCY,
+        global_rate: float = ADMISSION_GLOBAL_RATE,
+        global_burst: float = ADMISSION_GLOBAL_BURST,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        duplicate_window: float = ADMISSION_DUPLICATE_SECONDS,
+    ):
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.sender_concurrency = sender_concurrency
+        self.max_inflight = max_inflight
+        self.duplicate_window = duplicate_window
+        self.inflight = 0
+        self._global = TokenBucket(global_rate, global_burst)
+        self._senders: "OrderedDict[str, _EstadoRemitente]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _estado(self, sender: str) -> _EstadoRemitente:
+        estado = self._senders.get(sender)
+        if estado is None:
+            estado = self._senders[sender] = _EstadoRemitente(self.sender_rate, self.sender_burst)
+            if len(self._senders) > MAX_SENDERS:
+                self._senders.popitem(last=False)
+        else:
+            self._senders.move_to_end(sender)
+        return estado
+
+    def admitir(self, sender: str, message: str) -> Decision:
+        now = time.monotonic()
+        key = _ESPACIOS.sub(" ", message.lower()).strip()
+        with self._lock:
+            estado = self._estado(sender)
+
+            if key == estado.last_key and now - estado.last_time < self.duplicate_window:
+                metrics.inc("admission_total", result="duplicate")
+                return Decision(False)
+
+            if estado.inflight >= self.sender_concurrency or not estado.bucket.allow(now):
+                metrics.inc("admission_total", result="sender_limited")
+                # El aviso se manda una vez por ventana; el resto se descarta en silencio
+                if now < estado.notified_until:
+                    return Decision(False)
+                estado.notified_until = now + 1 / self.sender_rate if self.sender_rate else now
+                return Decision(False, MENSAJE_LIMITE)
+
+            if self.inflight >= self.max_inflight or not self._global.allow(now):
+                metrics.inc("admission_total", result="shed")
+                return Decision(False, MENSAJE_SATURADO)
+
+            estado.inflight += 1
+            estado.last_key = key
+            estado.last_time = now
+            self.inflight += 1
+            metrics.inc("admission_total", result="admitted")
+            return Decision(True, sender=sender)
+
+    def liberar(self, decision: Decision) -> None:
+        if not decision.admitido:
+            return
+        with self._lock:
+            self.inflight -= 1
+            estado = self._senders.get(decision.sender)
+            if estado is not None and estado.inflight > 0:
+                estado.inflight -= 1
+
+
+    def reiniciar_tras_fork(self) -> None:
+        # Las peticiones en curso del padre no son del hijo
+        self._lock = threading.Lock()
+        self._senders.clear()
+        self.inflight = 0
+
+
+class _SinControl:
+    # ADMISSION_ENABLED=false: todo se admite
+    def admitir(self, sender: str, message: str) -> Decision:
+        return Decision(True, sender=sender)
+
+    def liberar(self, decision: Decision) -> None:
+        pass
+
+
+admission = AdmissionController() if ADMISSION_ENABLED else _SinControl()
+if isinstance(admission, AdmissionController):
+    os.register_at_fork(after_in_child=admission.reiniciar_tras_fork)
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+from config.settings import AI_CACHE_SIZE, AI_CACHE_TTL_SECONDS, AI_CACHE_PATH
+from utils.metrics import metrics
+
+_ESPACIOS = re.compile(r"\s+")
+_FALTANTE = object()
+
+
+def _normalizar(value: Any) -> Any:
+    # Consultas que solo difieren en mayúsculas o espacios comparten entrada
+    if isinstance(value, str):
+        return _ESPACIOS.sub(" ", value.lower()).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalizar(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalizar(v) for v in value]
+    return value
+
+
+def cache_key(namespace: str, *args, **kwargs) -> str:
+    payload = json.dumps(
+        [namespace, _normalizar(list(args)), _normalizar(kwargs)],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché LRU con TTL para respuestas de OpenAI, con persistencia opcional en
+    SQLite y deduplicación de llamadas concurrentes idénticas (single-flight).
+    """
+
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL_SECONDS, path: Optional[str] = AI_CACHE_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    def _conexion(self) -> Optional[sqlite3.Connection]:
+        # Se abre al primer uso en cada proceso (con el lock tomado): los workers no heredan la del master
+        if not self.path:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    def reiniciar_tras_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def get(self, key: str) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+            db = self._conexion()
+            if db is None:
+                return _FALTANTE
+            row = db.execute(
+                "SELECT value, expires FROM ai_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= now:
+            return _FALTANTE
+        value = json.loads(row[0])
+        self._guardar_en_memoria(key, value, row[1])
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl
+        self._guardar_en_memoria(key, value, expires)
+        if self.path:
+            with self._lock:
+                db = self._conexion()
+                db.execute(
+                    "INSERT OR REPLACE INTO ai_cache (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires),
+                )
+                db.commit()
+
+    def _guardar_en_memoria(self, key: str, value: Any, expires: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is not _FALTANTE:
+            metrics.inc("ai_cache_total", result="hit")
+            return value
+        metrics.inc("ai_cache_total", result="miss")
+
+        with self._lock:
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not leader:
+            # Otra petición idéntica ya está consultando a OpenAI: se espera su resultado
+            event.wait()
+            value = self.get(key)
+            if value is not _FALTANTE:
+                return value
+            return compute()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+response_cache = ResponseCache()
+os.register_at_fork(after_in_child=response_cache.reiniciar_tras_fork)
+
+
+def cached_ai_call(namespace: str, ignore: tuple = ()):
+    """
+    Decorador para las llamadas a OpenAI. La clave se arma con los argumentos
+    normalizados (sin los de `ignore`, p. ej. el timeout); si la llamada lanza
+    una excepción no se guarda nada, así los fallbacks nunca quedan en caché.
+    """
+    def _key(args, kwargs) -> str:
+        return cache_key(namespace, *args, **{k: v for k, v in kwargs.items() if k not in ignore})
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if response_cache.maxsize <= 0:
+                return fn(*args, **kwargs)
+            key = _key(args, kwargs)
+            return response_cache.get_or_compute(key, lambda: fn(*args, **kwargs))
+        return wrapper
+
+    return decorator
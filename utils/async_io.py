@@ -0,0 +1,30 @@
+import asyncio
+from typing import Callable, Dict
+from config.settings import SHEETS_CONCURRENCY
+
+# Máximo de llamadas simultáneas por servicio externo
+UPSTREAM_LIMITS = {
+    "sheets": SHEETS_CONCURRENCY,
+}
+
+# Un semáforo por servicio y por event loop (uvicorn crea uno por worker)
+_semaphores: Dict[tuple, asyncio.Semaphore] = {}
+
+
+def limitar(upstream: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    key = (id(loop), upstream)
+    semaphore = _semaphores.get(key)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(UPSTREAM_LIMITS.get(upstream, 10))
+        _semaphores[key] = semaphore
+    return semaphore
+
+
+async def run_blocking(upstream: str, fn: Callable, *args, **kwargs):
+    """
+    Ejecuta una llamada bloqueante (gspread, SDKs síncronos) en un hilo,
+    respetando el límite de concurrencia del servicio, sin frenar el event loop.
+    """
+    async with limitar(upstream):
+        return await asyncio.to_thread(fn, *args, **kwargs)
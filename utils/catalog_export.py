@@ -0,0 +1,184 @@
+"""
+Exportación de la lista de precios de una financiera, como generadores sobre
+el snapshot del catálogo en memoria: cada fila se convierte y se entrega de
+a una, así la memoria no crece con el tamaño del catálogo.
+
+    python -m utils.catalog_export --financiera addi --formato csv > addi.csv
+    python -m utils.catalog_export --formato whatsapp --filtro samsung
+"""
+import io
+import csv
+import sys
+import json
+import argparse
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+from config.settings import VALORES_WORKSHEET, RECOMPRA_WORKSHEET
+from utils.catalog_index import normalizar_modelo, tokenizar
+from utils.pricing import motor_precios
+from utils.responses import MAX_CARACTERES_MENSAJE, render
+
+FORMATOS = ("csv", "json", "whatsapp")
+
+# Espacio que se deja en cada página para la instrucción de "página siguiente"
+_RESERVA_PIE = 150
+
+
+def columnas(financiera: Optional[str]) -> List[str]:
+    if not financiera:
+        return ["celular"]
+    return ["celular"] + list(motor_precios.regla(financiera).campos)
+
+
+def filas(catalog, financiera: Optional[str], filtro: str = "") -> Iterator[Dict]:
+    """
+    Valores de cada fila del catálogo (celular y, con financiera, su
+    cotización precalculada). Con `filtro` solo las filas que tienen todas
+    sus palabras ("samsung a", "moto g 24").
+    """
+    hoja = RECOMPRA_WORKSHEET if financiera == "recompra" else VALORES_WORKSHEET
+    sheet = catalog.sheet(hoja)
+    if sheet is None:
+        return
+    tokens = tokenizar(normalizar_modelo(filtro)) if filtro else []
+    for row in sheet.rows:
+        if tokens:
+            row_tokens = sheet.index.row_tokens[row.row_id]
+            if not all(token in row_tokens for token in tokens):
+                continue
+        if not financiera:
+            yield {"celular": row.celular}
+            continue
+        valores = motor_precios.valores(sheet.cotizaciones, row, financiera)
+        if valores is not None:
+            yield valores
+
+
+def exportar_csv(catalog, financiera: Optional[str], filtro: str = "") -> Iterator[str]:
+    # Un solo buffer que se vacía después de cada línea
+    campos = columnas(financiera)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def linea(valores: List) -> str:
+        writer.writerow(valores)
+        texto = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return texto
+
+    yield linea(campos)
+    for valores in filas(catalog, financiera, filtro):
+        yield linea([valores[campo] for campo in campos])
+
+
+def exportar_json(catalog, financiera: Optional[str], filtro: str = "") -> Iterator[str]:
+    # Arreglo JSON escrito por partes, un objeto por fila
+    campos = columnas(financiera)
+    yield "["
+    separador = "\n"
+    for valores in filas(catalog, financiera, filtro):
+        yield separador + json.dumps({campo: valores[campo] for campo in campos}, ensure_ascii=False)
+        separador = ",\n"
+    yield "\n]\n"
+
+
+def lineas_whatsapp(catalog, financiera: Optional[str], filtro: str = "") -> Iterator[str]:
+    if not financiera:
+        for valores in filas(catalog, None, filtro):
+            yield render("lista_modelo", **valores)
+        return
+    regla = motor_precios.regla(financiera)
+    for valores in filas(catalog, financiera, filtro):
+        # La línea de resumen de la regla, con el modelo en lugar de la financiera
+        valores["financiera"] = valores["celular"]
+        yield render(regla.resumen, **valores)
+
+
+def mensajes_whatsapp(
+    catalog, financiera: Optional[str], filtro: str = "", limite: int = MAX_CARACTERES_MENSAJE
+) -> Iterator[str]:
+    """
+    Lista de precios partida en mensajes de como máximo `limite` caracteres.
+    """
+    def titulo(pagina: int) -> str:
+        if financiera:
+            return render("lista_titulo", financiera=financiera.upper(), pagina=pagina)
+        return render("lista_titulo_modelos", pagina=pagina)
+
+    pagina = 1
+    encabezado = titulo(pagina)
+    partes: List[str] = []
+    largo = len(encabezado)
+    for linea in lineas_whatsapp(catalog, financiera, filtro):
+        linea = linea[: limite - len(encabezado)]
+        if partes and largo + len(linea) > limite:
+            yield encabezado + "\n".join(partes)
+            pagina += 1
+            encabezado = titulo(pagina)
+            partes = []
+            largo = len(encabezado)
+        partes.append(linea)
+        largo += len(linea) + 1
+    if partes:
+        yield encabezado + "\n".join(partes)
+
+
+def exportar(catalog, financiera: Optional[str], formato: str, filtro: str = "") -> Iterator[str]:
+    if formato == "csv":
+        return exportar_csv(catalog, financiera, filtro)
+    if formato == "json":
+        return exportar_json(catalog, financiera, filtro)
+    if formato == "whatsapp":
+        # Un mensaje por línea (JSON lines) para que otro sistema los envíe uno a uno
+        return (json.dumps(mensaje, ensure_ascii=False) + "\n" for mensaje in mensajes_whatsapp(catalog, financiera, filtro))
+    raise ValueError(f"Formato de exportación no soportado: {formato}")
+
+
+def pagina_whatsapp(catalog, financiera: Optional[str], filtro: str, pagina: int) -> str:
+    """
+    Una parte de la lista para responder "lista de modelos" en el chat. Solo
+    se generan las partes hasta la pedida y la siguiente.
+    """
+    mensajes = mensajes_whatsapp(catalog, financiera, filtro, MAX_CARACTERES_MENSAJE - _RESERVA_PIE)
+    partes = list(islice(mensajes, pagina - 1, pagina + 1))
+    if not partes:
+        if pagina == 1:
+            return render("lista_vacia", filtro=filtro or "todos")
+        total = sum(1 for _ in mensajes_whatsapp(catalog, financiera, filtro, MAX_CARACTERES_MENSAJE - _RESERVA_PIE))
+        return render("lista_fin", paginas=total, pagina=pagina)
+    texto = partes[0]
+    if len(partes) > 1:
+        comando = " ".join(p for p in ("lista de modelos", financiera, filtro, f"pagina {pagina + 1}") if p)
+        texto += render("lista_siguiente", comando=comando)
+    return texto
+
+
+def main(argv=None) -> int:
+    from utils.message_parser import normalizar_financiera
+    from utils.utils_methods import get_catalog
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--financiera", default="", help="sin financiera se listan solo los modelos")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--filtro", default="", help="marca o modelo, p. ej. 'samsung a'")
+    args = parser.parse_args(argv)
+
+    financiera = None
+    if args.financiera:
+        financiera = normalizar_financiera(args.financiera)
+        if not financiera:
+            print(f"Financiera desconocida: {args.financiera}", file=sys.stderr)
+            return 2
+
+    catalog = get_catalog()
+    if catalog is None:
+        print("No se pudo cargar el catálogo", file=sys.stderr)
+        return 1
+    for parte in exportar(catalog, financiera, args.formato, args.filtro):
+        sys.stdout.write(parte)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
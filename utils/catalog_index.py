@@ -0,0 +1,183 @@
+import re
+import heapq
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+
+# Normalizaciones aplicadas tanto a la búsqueda como a cada CELULAR del catálogo
+_NORMALIZACIONES = [
+    # Modelos Samsung (A35 -> A 35)
+    (re.compile(r"SAMSUNG\s*A\s*(\d+)"), r"SAMSUNG A \1"),
+    (re.compile(r"SAMSUNG\s*([A-Z]+)\s*(\d+)"), r"SAMSUNG \1 \2"),
+    # Modelos OPPO
+    (re.compile(r"OPPO\s*A\s*(\d+)"), r"OPPO A\1"),
+    (re.compile(r"OPPO\s*([A-Z]+)\s*(\d+)"), r"OPPO \1\2"),
+    # Memoria
+    (re.compile(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*GB"), r"\1GB/\2GB"),
+    (re.compile(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*RAM"), r"\1GB/\2RAM"),
+    (re.compile(r"(\d+)\s*GB"), r"\1GB"),
+    (re.compile(r"(\d+)\s*RAM"), r"\1RAM"),
+]
+_ESPACIOS = re.compile(r"\s+")
+_SEPARADOR = re.compile(r"\s+|/")
+_NO_DIGITOS = re.compile(r"\D")
+
+# Parámetros del ranking
+SHORTLIST_SIZE = 50
+MIN_TOKEN_SIMILARITY = 0.5
+MIN_SCORE = 0.45
+SCORE_WINDOW = 0.2
+CONFIDENT_SCORE = 0.8
+
+
+def normalizar_modelo(texto: str) -> str:
+    texto = str(texto).upper().strip()
+    for pattern, repl in _NORMALIZACIONES:
+        texto = pattern.sub(repl, texto)
+    return _ESPACIOS.sub(" ", texto).strip()
+
+
+def tokenizar(normalizado: str) -> List[str]:
+    return [part for part in _SEPARADOR.split(normalizado) if part]
+
+
+def trigramas(normalizado: str) -> Set[str]:
+    compacto = normalizado.replace(" ", "").replace("/", "")
+    return {compacto[i:i + 3] for i in range(len(compacto) - 2)}
+
+
+def distancia_edicion(a: str, b: str) -> int:
+    # Levenshtein clásico, los tokens comparados son cortos
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        previous = current
+    return previous[-1]
+
+
+@lru_cache(maxsize=65536)
+def similitud_token(a: str, b: str) -> float:
+    """
+    Similitud entre 0 y 1 entre dos tokens, tolerante a errores de tipeo.
+
+    Si los números del token (modelo, GB, RAM) no coinciden la similitud se
+    castiga, para que "A15" no se confunda con "A25". Los pares se memorizan:
+    el vocabulario del catálogo es pequeño y se repite entre candidatos.
+    """
+    if a == b:
+        return 1.0
+    # La distancia nunca es menor que la diferencia de largos: se descarta sin calcularla
+    if 1 - abs(len(a) - len(b)) / max(len(a), len(b)) < MIN_TOKEN_SIMILARITY:
+        return 0.0
+    similitud = 1 - distancia_edicion(a, b) / max(len(a), len(b))
+    digitos_a = _NO_DIGITOS.sub("", a)
+    if digitos_a and digitos_a != _NO_DIGITOS.sub("", b):
+        similitud *= 0.5
+    return similitud if similitud >= MIN_TOKEN_SIMILARITY else 0.0
+
+
+def _peso(token: str) -> float:
+    # Los tokens con números identifican el modelo y la capacidad
+    return 2.0 if any(c.isdigit() for c in token) else 1.0
+
+
+class CatalogIndex:
+    """
+    Índice de búsqueda de una hoja, construido una sola vez por snapshot.
+
+    Guarda el CELULAR normalizado de cada fila y sus tokens, un mapa hash para
+    las coincidencias exactas, un índice invertido de tokens y uno de
+    trigramas para preseleccionar candidatos antes de puntuarlos.
+    """
+
+    def __init__(self, models: List[str]):
+        self.keys: List[str] = []
+        self.row_tokens: List[List[str]] = []
+        self.exact: Dict[str, List[int]] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.grams: Dict[str, Set[int]] = {}
+
+        for row_id, celular in enumerate(models):
+            key = normalizar_modelo(celular)
+            row_tokens = tokenizar(key)
+            self.keys.append(key)
+            self.row_tokens.append(row_tokens)
+            self.exact.setdefault(key, []).append(row_id)
+            for token in set(row_tokens):
+                self.tokens.setdefault(token, set()).add(row_id)
+            for gram in trigramas(key):
+                self.grams.setdefault(gram, set()).add(row_id)
+
+    def buscar(self, busqueda: str, limit: int = 5) -> Tuple[List[int], List[int]]:
+        """
+        Devuelve los ids de fila con coincidencia exacta y los candidatos
+        aproximados ordenados por puntaje (como máximo `limit`).
+
+        Si un único candidato queda con puntaje alto se devuelve como exacto.
+        """
+        return self.buscar_normalizado(normalizar_modelo(busqueda), limit)
+
+    def buscar_normalizado(self, busqueda: str, limit: int = 5) -> Tuple[List[int], List[int]]:
+        exact_ids = self.exact.get(busqueda, [])
+        if exact_ids:
+            return exact_ids, []
+
+        ranked = self.rankear(busqueda)
+        if not ranked:
+            return [], []
+
+        best_score = ranked[0][1]
+        threshold = max(MIN_SCORE, best_score - SCORE_WINDOW)
+        ranked_ids = [row_id for row_id, score in ranked if score >= threshold][:limit]
+
+        if len(ranked_ids) == 1 and best_score >= CONFIDENT_SCORE:
+            return ranked_ids, []
+        return [], ranked_ids
+
+    def rankear(self, normalizado: str) -> List[Tuple[int, float]]:
+        query_tokens = tokenizar(normalizado)
+        if not query_tokens:
+            return []
+
+        candidates = self._preseleccionar(normalizado, query_tokens)
+        scored = [(row_id, self._puntuar(query_tokens, row_id)) for row_id in candidates]
+        scored = [item for item in scored if item[1] >= MIN_SCORE]
+        # Mayor puntaje primero; en empate se respeta el orden de la hoja
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored
+
+    def _preseleccionar(self, normalizado: str, query_tokens: List[str]) -> List[int]:
+        hits: Counter = Counter()
+        for gram in trigramas(normalizado):
+            for row_id in self.grams.get(gram, ()):
+                hits[row_id] += 1
+        for token in query_tokens:
+            for row_id in self.tokens.get(token, ()):
+                hits[row_id] += 1
+        return [row_id for row_id, _ in heapq.nlargest(SHORTLIST_SIZE, hits.items(), key=lambda item: item[1])]
+
+    def _puntuar(self, query_tokens: List[str], row_id: int) -> float:
+        row_tokens = self.row_tokens[row_id]
+        if not row_tokens:
+            return 0.0
+        total = 0.0
+        matched = 0.0
+        for token in query_tokens:
+            peso = _peso(token)
+            total += peso
+            matched += peso * max(similitud_token(token, row_token) for row_token in row_tokens)
+        query_coverage = matched / total
+
+        # Pequeño bono a las filas sin tokens de sobra (más específicas)
+        row_coverage = min(len(query_tokens), len(row_tokens)) / len(row_tokens)
+        return 0.85 * query_coverage + 0.15 * row_coverage
@@ -0,0 +1,84 @@
+import os
+import pickle
+import logging
+import tempfile
+from typing import Any, Optional, Tuple
+from config.settings import CATALOG_SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
+
+# Se incrementa cuando cambia la estructura de CatalogRow/SheetSnapshot/CatalogIndex
+SNAPSHOT_FORMAT = 2
+
+
+class CatalogStore:
+    """
+    Copia local del último catálogo bueno (filas parseadas e índices ya
+    construidos) en un archivo binario. Al arrancar se carga en milisegundos,
+    antes de la primera llamada a Google, y permite seguir respondiendo si
+    Google Sheets no está disponible.
+    """
+
+    def __init__(self, path: Optional[str] = CATALOG_SNAPSHOT_PATH):
+        self.path = path
+        # Identidad del archivo que corresponde al snapshot en memoria
+        self.last_stamp: Optional[Tuple[int, int]] = None
+
+    def stamp(self) -> Optional[Tuple[int, int]]:
+        # os.replace crea un inodo nuevo, así que (inodo, mtime) cambia con cada publicación
+        try:
+            st = os.stat(self.path)
+        except (OSError, TypeError):
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def load(self) -> Tuple[Optional[Any], Optional[str]]:
+        # Devuelve (snapshot, señal de cambios) o (None, None) si no hay copia usable
+        if not self.path or not os.path.exists(self.path):
+            return None, None
+        try:
+            with open(self.path, "rb") as f:
+                stamp = os.fstat(f.fileno())
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la copia local del catálogo {self.path}: {e}")
+            return None, None
+        if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+            logger.warning(f"Copia local del catálogo con formato incompatible, se ignora: {self.path}")
+            return None, None
+        self.last_stamp = stamp.st_ino, stamp.st_mtime_ns
+        return data["snapshot"], data.get("signal")
+
+    def save(self, snapshot: Any, signal: Optional[str] = None) -> None:
+        if not self.path:
+            return
+        data = {"format": SNAPSHOT_FORMAT, "snapshot": snapshot, "signal": signal}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            # Se escribe en un temporal y se reemplaza: un lector nunca ve un archivo a medias
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+                self.last_stamp = self.stamp()
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la copia local del catálogo: {e}")
+
+    def request_refresh(self) -> None:
+        # Un worker pide al proceso que refresca una descarga inmediata
+        if self.path:
+            with open(self.path + ".refresh", "a"):
+                pass
+
+    def consume_refresh_request(self) -> bool:
+        if not self.path:
+            return False
+        try:
+            os.remove(self.path + ".refresh")
+            return True
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+from config.settings import STATE_BACKEND, STATE_TTL_SECONDS, STATE_SQLITE_PATH, STATE_REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStateStore:
+    """
+    Estado de conversación en memoria del proceso, con vencimiento por TTL.
+    Sirve para un solo proceso; con varios workers usar SQLite o Redis.
+    """
+
+    def __init__(self, ttl: float = STATE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}
+        self._last_purge = time.time()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.time():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (value, now + self.ttl)
+            # Limpieza periódica de conversaciones vencidas
+            if now - self._last_purge > self.ttl:
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                self._last_purge = now
+
+    def reiniciar_tras_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def pop(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+
+class SQLiteStateStore:
+    """
+    Estado de conversación en un archivo SQLite compartido por todos los
+    workers de la máquina. pop() lee y borra en la misma transacción.
+    """
+
+    def __init__(self, path: str = STATE_SQLITE_PATH, ttl: float = STATE_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        # La conexión de creación se cierra: con preload_app un worker no debe heredar conexiones del master
+        db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_state (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+            )
+        finally:
+            db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Una conexión por hilo y por proceso; sqlite3 no comparte conexiones entre hilos ni tras un fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT value FROM conversation_state WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Dict) -> None:
+        now = time.time()
+        db = self._connect()
+        db.execute(
+            "INSERT OR REPLACE INTO conversation_state (key, value, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), now + self.ttl),
+        )
+        db.execute("DELETE FROM conversation_state WHERE expires <= ?", (now,))
+
+    def pop(self, key: str) -> Optional[Dict]:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT value FROM conversation_state WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+            db.execute("DELETE FROM conversation_state WHERE key = ?", (key,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return json.loads(row[0]) if row else None
+
+
+class RedisStateStore:
+    """
+    Estado de conversación en Redis (o un servidor compatible), para varios
+    procesos o máquinas. Requiere el paquete `redis`.
+    """
+
+    def __init__(self, url: str = STATE_REDIS_URL, ttl: float = STATE_TTL_SECONDS, prefix: str = "credicell:state:"):
+        import redis
+
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._redis.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def set(self, key: str, value: Dict) -> None:
+        self._redis.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def pop(self, key: str) -> Optional[Dict]:
+        pipe = self._redis.pipeline()
+        pipe.get(self.prefix + key)
+        pipe.delete(self.prefix + key)
+        value, _ = pipe.execute()
+        return json.loads(value) if value else None
+
+
+def crear_store(backend: str = STATE_BACKEND):
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    if backend == "redis":
+        return RedisStateStore()
+    if backend != "memory":
+        logger.warning(f"STATE_BACKEND desconocido '{backend}', se usa memoria")
+    return MemoryStateStore()
+
+
+conversation_store = crear_store()
+if isinstance(conversation_store, MemoryStateStore):
+    os.register_at_fork(after_in_child=conversation_store.reiniciar_tras_fork)
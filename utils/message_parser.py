@@ -0,0 +1,225 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from config.settings import PARSER_CACHE_SIZE
+
+# Alias aceptados para cada financiera (el primero de cada lista es el nombre canónico)
+FINANCIERA_ALIASES: Dict[str, list] = {
+    "krediya": ["krediya", "kredi", "credia", "crediya"],
+    "adelantos": ["adelantos", "adelanto"],
+    "sumas pay": ["sumas pay", "sumaspay", "sumas"],
+    "addi": ["addi"],
+    "banco de bogota": ["banco de bogota", "bancobogota", "bogota"],
+    "brilla": ["brilla"],
+    "recompra": ["recompra", "re compra"],
+    "contado": ["contado"],
+}
+
+# Alias sin espacios -> financiera canónica
+_ALIAS_LOOKUP = {
+    alias.replace(" ", ""): financiera
+    for financiera, aliases in FINANCIERA_ALIASES.items()
+    for alias in aliases
+}
+
+
+def _alias_pattern() -> str:
+    variants = {
+        r"\s*".join(re.escape(part) for part in alias.split())
+        for aliases in FINANCIERA_ALIASES.values()
+        for alias in aliases
+    }
+    # Los alias más largos primero para que "sumas pay" gane sobre "sumas"
+    return "|".join(sorted(variants, key=len, reverse=True))
+
+
+_CONSULTA = r"(?:precios?|info|informaci[oó]n|consulta)"
+
+_FINANCIERA_PATTERN = re.compile(
+    _CONSULTA + r"\s*(?:por|de|para)?\s*"
+    r"(" + _alias_pattern() + r")\b\s*"
+    r"(?:(?:del|de|para|sobre)\b\s*)?(.+)",
+    re.IGNORECASE,
+)
+
+# Consultas en lote: "precios por addi y brilla de A15 y A25"
+_SEPARADOR = r"\s*(?:,|;|&|\by\b|\be\b|\bvs\b\.?)\s*"
+_ALIAS = "(?:" + _alias_pattern() + r")\b"
+_LOTE_PATTERN = re.compile(
+    _CONSULTA + r"\s*(?:por|de|para)?\s*"
+    r"(" + _ALIAS + r"(?:" + _SEPARADOR + _ALIAS + r")*)\s*"
+    r"(?:(?:del|de|para|sobre)\b\s*)?(.+)",
+    re.IGNORECASE,
+)
+_ALIAS_RE = re.compile(_ALIAS, re.IGNORECASE)
+# Con grupo de captura: al volver a unir dos pedazos se usa el separador original ("moto e 22")
+_SEPARADOR_RE = re.compile("(" + _SEPARADOR + ")", re.IGNORECASE)
+_SOLO_MEMORIA = re.compile(r"^\d+\s*(?:gb|g|ram|tb)\b")
+_TIENE_DIGITO = re.compile(r"\d")
+
+# Lista de precios: "lista de modelos addi samsung pagina 2"
+_LISTA_PATTERN = re.compile(r"^(?:lista|listado|cat[aá]logo)\s+de\s+(?:modelos|precios|celulares)\b(.*)$")
+_PAGINA_PATTERN = re.compile(r"\b(?:p[aá]gina|pag|parte)\s*(\d+)\b")
+_RELLENO_LISTA = re.compile(r"\b(?:por|de|del|para|con)\b")
+
+# Tope de modelos por consulta en lote (la respuesta debe caber en un mensaje)
+MAX_MODELOS_LOTE = 5
+
+# Palabras de relleno que se eliminan del modelo (solo palabras completas)
+_STOP_WORDS = re.compile(r"\b(?:precios?|info|informaci[oó]n|consulta|por|de|para)\b")
+_STOP_WORDS_CONTADO = re.compile(r"\b(?:precios?|info|informaci[oó]n|consulta|por|de|para|contado)\b")
+_NO_ALFANUMERICO = re.compile(r"[^a-zA-Z0-9\s]")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def _limpiar_modelo(texto: str, stop_words=_STOP_WORDS) -> str:
+    modelo = stop_words.sub("", texto)
+    modelo = _NO_ALFANUMERICO.sub("", modelo).upper()
+    return _ESPACIOS.sub(" ", modelo).strip()
+
+
+def normalizar_financiera(nombre: str) -> Optional[str]:
+    # Sin tildes ni espacios: "Banco de Bogotá" -> "bancodebogota"
+    nombre = unicodedata.normalize("NFKD", nombre.lower()).encode("ascii", "ignore").decode()
+    return _ALIAS_LOOKUP.get(_ESPACIOS.sub("", nombre))
+
+
+def _parse(message: str) -> Tuple[Optional[str], str]:
+    # Primero detectar si es una consulta de contado
+    if "contado" in message:
+        return "contado", _limpiar_modelo(message, _STOP_WORDS_CONTADO)
+
+    match = _FINANCIERA_PATTERN.search(message)
+    if match:
+        financiera = normalizar_financiera(match.group(1))
+        return financiera, _limpiar_modelo(match.group(2).strip())
+
+    return None, _limpiar_modelo(message)
+
+
+if PARSER_CACHE_SIZE > 0:
+    _parse = lru_cache(maxsize=PARSER_CACHE_SIZE)(_parse)
+
+
+def parse_user_message(message: str) -> tuple:
+    """
+    Extrae (financiera, modelo) de un mensaje. Los mensajes recientes ya
+    normalizados se memorizan, así que repetir una consulta no vuelve a parsearla.
+    """
+    message = _ESPACIOS.sub(" ", message.lower()).strip()
+    return _parse(message)
+
+
+def _partir_modelos(texto: str) -> List[str]:
+    """
+    Separa "a15 y a25" o "iphone 13, 14" en modelos. Un pedazo sin números
+    se une al siguiente con su separador original ("moto e 22", "vivo y 36"),
+    y uno que es solo memoria ("128gb y 6ram") se une al anterior. Si el
+    pedazo empieza por el número hereda todo lo que precede al número en el
+    modelo anterior ("redmi note 13, 14"). Uno que empieza por letras se deja
+    tal cual: en "iphone 13 y a15" el "a15" no es de la misma marca, y la
+    búsqueda aproximada encuentra "a25" sin que se le anteponga nada.
+    """
+    trozos = _SEPARADOR_RE.split(texto)
+    modelos: List[str] = []
+    pendiente = ""
+    antes = ""
+    for i in range(0, len(trozos), 2):
+        parte = trozos[i].strip()
+        if not parte:
+            continue
+        if pendiente:
+            parte = pendiente + trozos[i - 1] + parte
+            pendiente = ""
+        if not _TIENE_DIGITO.search(parte):
+            pendiente = parte
+            antes = trozos[i - 1] if i else ""
+            continue
+        if modelos and _SOLO_MEMORIA.match(parte):
+            modelos[-1] = f"{modelos[-1]} {parte}"
+            continue
+        palabras = parte.split()
+        if modelos and palabras[0].isdigit():
+            prefijo = []
+            for palabra in modelos[-1].split():
+                if _TIENE_DIGITO.search(palabra):
+                    break
+                prefijo.append(palabra)
+            if not prefijo:
+                modelos[-1] = f"{modelos[-1]} {parte}"
+                continue
+            parte = " ".join(prefijo + palabras)
+        modelos.append(parte)
+    if pendiente:
+        if modelos:
+            modelos[-1] = modelos[-1] + antes + pendiente
+        else:
+            modelos.append(pendiente)
+    return modelos
+
+
+def parse_batch_message(message: str) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Extrae ([financieras], [modelos]) de una consulta con varias financieras
+    o varios modelos. Devuelve None si es una consulta simple (un modelo y una
+    financiera), que sigue por parse_user_message(). Devuelve todos los
+    modelos pedidos: el tope MAX_MODELOS_LOTE lo aplica quien responde, para
+    poder avisar cuántos quedaron fuera.
+    """
+    message = _ESPACIOS.sub(" ", message.lower()).strip()
+    match = _LOTE_PATTERN.search(message)
+    if not match:
+        return None
+
+    financieras: List[str] = []
+    for alias in _ALIAS_RE.findall(match.group(1)):
+        financiera = normalizar_financiera(alias)
+        if financiera and financiera not in financieras:
+            financieras.append(financiera)
+
+    modelos: List[str] = []
+    for parte in _partir_modelos(match.group(2)):
+        modelo = _limpiar_modelo(parte)
+        if modelo and modelo not in modelos:
+            modelos.append(modelo)
+
+    if not financieras or not modelos or (len(financieras) < 2 and len(modelos) < 2):
+        return None
+    return financieras, modelos
+
+
+def parse_list_message(message: str) -> Optional[Tuple[Optional[str], str, int]]:
+    """
+    Extrae (financiera, filtro, página) de "lista de modelos [financiera]
+    [marca o modelo] [página N]". La financiera es opcional: sin ella se
+    listan solo los nombres.
+    """
+    message = _ESPACIOS.sub(" ", message.lower()).strip()
+    match = _LISTA_PATTERN.match(message)
+    if not match:
+        return None
+    resto = match.group(1)
+
+    pagina = 1
+    match = _PAGINA_PATTERN.search(resto)
+    if match:
+        pagina = max(1, int(match.group(1)))
+        resto = resto[:match.start()] + resto[match.end():]
+
+    financiera = None
+    match = _ALIAS_RE.search(resto)
+    if match:
+        financiera = normalizar_financiera(match.group(0))
+        resto = resto[:match.start()] + resto[match.end():]
+
+    filtro = _ESPACIOS.sub(" ", _RELLENO_LISTA.sub(" ", resto)).strip()
+    return financiera, filtro, pagina
+
+
+def parser_cache_info() -> Optional[Tuple[int, int]]:
+    # (aciertos, fallos) de la caché del parser, o None si está desactivada
+    if not hasattr(_parse, "cache_info"):
+        return None
+    info = _parse.cache_info()
+    return info.hits, info.misses
@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Límites (segundos) de los histogramas de latencia: de 0.5 ms a 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Histograma acumulativo al estilo Prometheus (conteo por bucket, suma y total).
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Aproximación por el límite superior del bucket donde cae el cuantil
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """
+    Contadores, gauges e histogramas en memoria del proceso, con etiquetas
+    opcionales. render_prometheus() los exporta en formato de texto.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        self._gauges: Dict[Tuple[str, tuple], float] = {}
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+
+    def reiniciar_tras_fork(self) -> None:
+        # Cada worker cuenta solo lo que atiende, sin lo heredado del master
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def gauge(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage: str):
+        """
+        Mide la duración de una etapa del webhook en stage_duration_seconds.
+        Sirve como `with metrics.span("lookup"):` o como decorador.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def counters(self) -> Dict[str, float]:
+        with self._lock:
+            items = list(self._counters.items())
+        result = {}
+        for (name, labels), value in sorted(items):
+            result[_nombre(name, labels)] = value
+        return result
+
+    def latencies(self) -> Dict[str, Dict[str, float]]:
+        # Resumen p50/p99 de cada histograma, para /health
+        with self._lock:
+            items = [(key, h.count, h.quantile(0.5), h.quantile(0.99)) for key, h in self._histograms.items()]
+        return {
+            _nombre(name, labels): {"count": count, "p50": p50, "p99": p99}
+            for (name, labels), count, p50, p99 in sorted(items)
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Cada proceso tiene su propio registro: todas las series llevan la
+        etiqueta pid para distinguir a los workers (sumar con `sum without (pid)`).
+        """
+        proceso = (("pid", os.getpid()),)
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(
+                (key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items()
+            )
+
+        lines: List[str] = []
+        typed = set()
+        for kind, items in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in items:
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{_prometheus(name, proceso + labels)} {value:g}")
+
+        for (name, labels), counts, total, count, buckets in histograms:
+            labels = proceso + labels
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{_prometheus(name + '_bucket', labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{_prometheus(name + '_bucket', labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{_prometheus(name + '_sum', labels)} {total:g}")
+            lines.append(f"{_prometheus(name + '_count', labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _nombre(name: str, labels: tuple) -> str:
+    label_str = ",".join(f"{k}={v}" for k, v in labels)
+    return f"{name}{{{label_str}}}" if label_str else name
+
+
+def _prometheus(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{_escapar(v)}"' for k, v in labels)
+    return f"{name}{{{label_str}}}"
+
+
+def _escapar(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = MetricsRegistry()
+os.register_at_fork(after_in_child=metrics.reiniciar_tras_fork)
@@ -0,0 +1,196 @@
+import json
+import inspect
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from config.settings import ERRORES_CONFIGURACION, PRICING_RULES_PATH
+from utils.responses import PLANTILLAS
+
+logger = logging.getLogger(__name__)
+
+# Columnas de precio que se convierten a enteros al cargar el snapshot
+PRICE_COLUMNS = {
+    "VENTA": "venta",
+    "INICIAL FINANCIERA": "inicial_financiera",
+    "INICIAL REAL": "inicial_real",
+    "PRECIO BASE": "precio_base",
+    "PRECIO ADDI Y SUMAS": "precio_addi_sumas",
+    "CONTADO": "contado",
+}
+# Valores que las plantillas reciben además de los campos de la regla
+CAMPOS_FIJOS = {"celular", "financiera"}
+
+# nombre -> (campos que produce, función fila -> tupla de valores)
+REGLAS: Dict[str, Tuple[Tuple[str, ...], Callable]] = {}
+
+
+def registrar_regla(nombre: str, campos: Tuple[str, ...]):
+    """
+    Registra un tipo de regla de precios. La función recibe la fila y los
+    parámetros de la configuración y devuelve los valores de `campos` en orden.
+    Los parámetros anotados `str` o `List[str]` son columnas de precio.
+    """
+    def decorator(fn):
+        REGLAS[nombre] = (campos, fn)
+        return fn
+    return decorator
+
+
+@registrar_regla("inicial", ("venta", "porcentaje_inicial", "inicial_financiera", "inicial_real"))
+def _regla_inicial(row) -> tuple:
+    # Porcentaje de la inicial financiera sobre el precio de venta
+    porcentaje = round((row.inicial_financiera / row.venta) * 100) if row.venta else 0
+    return row.venta, porcentaje, row.inicial_financiera, row.inicial_real
+
+
+@registrar_regla("recargo", ("total",))
+def _regla_recargo(row, columna: str = "precio_base", valor: int = 0) -> tuple:
+    return (getattr(row, columna) + valor,)
+
+
+@registrar_regla("suma", ("total",))
+def _regla_suma(row, columnas: List[str] = ("precio_base", "precio_addi_sumas")) -> tuple:
+    return (sum(getattr(row, columna) for columna in columnas),)
+
+
+# Configuración por defecto; "*" aplica a las financieras que no están listadas
+REGLAS_POR_DEFECTO = {
+    "krediya": {"regla": "inicial", "plantilla": "inicial"},
+    "adelantos": {"regla": "inicial", "plantilla": "inicial"},
+    "recompra": {"regla": "inicial", "plantilla": "recompra"},
+    "contado": {"regla": "recargo", "columna": "precio_base", "valor": 180000, "plantilla": "contado"},
+    "*": {"regla": "suma", "columnas": ["precio_base", "precio_addi_sumas"], "plantilla": "generica"},
+}
+
+
+class ReglaFinanciera:
+    """
+    Regla de precios configurada para una financiera: tipo de regla, sus
+    parámetros, la plantilla de respuesta (utils.responses) y la de una línea
+    para los comparativos.
+    """
+
+    def __init__(self, nombre: str, regla: str, plantilla: str, resumen: Optional[str] = None, **params):
+        if regla not in REGLAS:
+            raise ValueError(f"Regla de precios desconocida para {nombre}: {regla}")
+        self.nombre = nombre
+        self.regla = regla
+        self.plantilla = plantilla
+        self.params = params
+        self.campos, self._fn = REGLAS[regla]
+        self.resumen = resumen or ("resumen_total" if "total" in self.campos else "resumen_inicial")
+        problemas = self._problemas()
+        if problemas:
+            raise ValueError(f"{nombre}: {'; '.join(problemas)}")
+        # Financieras con la misma regla y parámetros comparten la tabla precalculada
+        self.clave = f"{regla}:{json.dumps(params, sort_keys=True)}"
+
+    def _problemas(self) -> List[str]:
+        # Se revisa al cargar: un error aquí no debe aparecer recién al responder
+        problemas = []
+        firma = inspect.signature(self._fn)
+        try:
+            firma.bind(None, **self.params)
+        except TypeError as e:
+            problemas.append(f"parámetros inválidos para la regla {self.regla}: {e}")
+        columnas = set(PRICE_COLUMNS.values())
+        for clave, valor in self.params.items():
+            if clave not in firma.parameters:
+                continue
+            tipo = firma.parameters[clave].annotation
+            if tipo is str:
+                valor = [valor]
+            if tipo in (str, List[str]):
+                if not isinstance(valor, list) or not all(isinstance(v, str) and v in columnas for v in valor):
+                    problemas.append(f"{clave}={valor!r} debe ser columna(s) de precio: {', '.join(sorted(columnas))}")
+            elif tipo is int and (not isinstance(valor, int) or isinstance(valor, bool)):
+                problemas.append(f"{clave}={valor!r} debe ser un número entero")
+        disponibles = set(self.campos) | CAMPOS_FIJOS
+        for plantilla in (self.plantilla, self.resumen):
+            if plantilla not in PLANTILLAS:
+                problemas.append(f"plantilla desconocida: {plantilla}")
+                continue
+            faltan = PLANTILLAS[plantilla].campos - disponibles
+            if faltan:
+                problemas.append(f"la plantilla {plantilla} usa {', '.join(sorted(faltan))}, que la regla {self.regla} no calcula")
+        return problemas
+
+    def calcular(self, row) -> tuple:
+        return self._fn(row, **self.params)
+
+
+class MotorPrecios:
+    """
+    Motor de precios por financiera. Al cargar un snapshot se precalculan las
+    cotizaciones de todas las filas para cada regla distinta, así responder
+    una consulta es leer una tupla de la tabla.
+    """
+
+    def __init__(self, config: Dict[str, Dict]):
+        self.reglas: Dict[str, ReglaFinanciera] = {}
+        problemas = []
+        for nombre, opciones in config.items():
+            try:
+                opciones = dict(opciones)
+                self.reglas[nombre] = ReglaFinanciera(nombre, opciones.pop("regla"), opciones.pop("plantilla"), **opciones)
+            except KeyError as e:
+                problemas.append(f"{nombre}: falta {e}")
+            except (TypeError, ValueError) as e:
+                problemas.append(str(e))
+        if problemas:
+            raise ValueError(" | ".join(problemas))
+        if "*" not in self.reglas:
+            self.reglas["*"] = ReglaFinanciera("*", **dict(REGLAS_POR_DEFECTO["*"]))
+
+    @classmethod
+    def desde_archivo(cls, path: Optional[str]) -> "MotorPrecios":
+        if not path:
+            return cls(REGLAS_POR_DEFECTO)
+        try:
+            with open(path, encoding="utf-8") as f:
+                config = json.load(f)
+            motor = cls(config)
+            logger.info(f"Reglas de precios cargadas de {path}: {sorted(config)}")
+            return motor
+        except Exception as e:
+            logger.error(f"No se pudieron cargar las reglas de precios de {path}, se usan las por defecto: {e}")
+            ERRORES_CONFIGURACION.append(f"PRICING_RULES_PATH={path} inválido ({e}); se usan las reglas por defecto")
+            return cls(REGLAS_POR_DEFECTO)
+
+    def regla(self, financiera: str) -> ReglaFinanciera:
+        return self.reglas.get(financiera) or self.reglas["*"]
+
+    def precalcular(self, rows: List) -> Dict[str, List[Optional[tuple]]]:
+        tablas: Dict[str, List[Optional[tuple]]] = {}
+        for regla in self.reglas.values():
+            if regla.clave in tablas:
+                continue
+            tabla = []
+            for row in rows:
+                try:
+                    tabla.append(regla.calcular(row))
+                except Exception as e:
+                    logger.error(f"Error calculando {regla.nombre} para {row.celular}: {e}")
+                    tabla.append(None)
+            tablas[regla.clave] = tabla
+        return tablas
+
+    def valores(self, tablas: Dict[str, List[Optional[tuple]]], row, financiera: str) -> Optional[Dict]:
+        """
+        Valores para la plantilla de la financiera, leídos de la tabla
+        precalculada (o calculados al vuelo si la fila no está en ella).
+        """
+        regla = self.regla(financiera)
+        tabla = tablas.get(regla.clave)
+        if tabla is not None and row.row_id < len(tabla):
+            cotizacion = tabla[row.row_id]
+        else:
+            cotizacion = regla.calcular(row)
+        if cotizacion is None:
+            return None
+        valores = dict(zip(regla.campos, cotizacion))
+        valores["celular"] = row.celular
+        valores["financiera"] = financiera.upper()
+        return valores
+
+
+motor_precios = MotorPrecios.desde_archivo(PRICING_RULES_PATH)
@@ -0,0 +1,87 @@
+import os
+import sys
+import logging
+import threading
+from collections import Counter
+from typing import Optional
+from config.settings import PROFILER_ENABLED, PROFILER_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Perfilador por muestreo para producción: un hilo toma cada cierto tiempo
+    la pila de todos los demás hilos y cuenta cuántas veces aparece cada una.
+    El resultado está en formato "collapsed stacks" (una pila por línea con su
+    conteo), listo para flamegraph.pl o speedscope.
+    """
+
+    def __init__(self, interval: float = PROFILER_INTERVAL_SECONDS, max_depth: int = 40):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Perfilador por muestreo activo (cada {self.interval * 1000:.0f} ms)")
+
+    def iniciar(self) -> None:
+        # Se llama en cada proceso que atiende peticiones (post_fork de gunicorn, lifespan, bot.py):
+        # un hilo arrancado en el master no existe en los workers
+        if PROFILER_ENABLED:
+            self.start()
+
+    def reiniciar_tras_fork(self) -> None:
+        # El hilo de muestreo del padre no existe en el hijo
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stacks = Counter()
+        self.samples = 0
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def _loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+
+profiler = SamplingProfiler()
+os.register_at_fork(after_in_child=profiler.reiniciar_tras_fork)
@@ -0,0 +1,214 @@
+import os
+import time
+import queue
+import random
+import logging
+import threading
+import zlib
+from typing import Callable, List, Optional, Tuple
+from config.settings import (
+    REPLY_SENDER,
+    REPLY_WORKERS,
+    REPLY_QUEUE_SIZE,
+    REPLY_MAX_RETRIES,
+    REPLY_BACKOFF_SECONDS,
+    REPLY_TIMEOUT_SECONDS,
+    TWILIO_ACCOUNT_SID,
+    TWILIO_AUTH_TOKEN,
+    TWILIO_WHATSAPP_FROM,
+)
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableSendError(Exception):
+    """
+    Fallo de envío que vale la pena reintentar (red, 429 o 5xx de Twilio).
+    """
+
+
+class TwilioSender:
+    """
+    Envía mensajes con la API REST de Twilio. El cliente y su sesión HTTP
+    (con pool de conexiones) se crean una sola vez por proceso.
+    """
+
+    def __init__(
+        self,
+        account_sid: Optional[str] = TWILIO_ACCOUNT_SID,
+        auth_token: Optional[str] = TWILIO_AUTH_TOKEN,
+        timeout: float = REPLY_TIMEOUT_SECONDS,
+    ):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
+
+                http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+                self._client = Client(self.account_sid, self.auth_token, http_client=http_client)
+            return self._client
+
+    def reiniciar_tras_fork(self) -> None:
+        # El cliente y su pool de conexiones son del padre
+        self._lock = threading.Lock()
+        self._client = None
+
+    def send(self, from_: str, to: str, body: str) -> None:
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            self.client().messages.create(from_=from_, to=to, body=body)
+        except TwilioRestException as e:
+            if e.status == 429 or e.status >= 500:
+                raise RetryableSendError(str(e)) from e
+            raise
+        except OSError as e:
+            raise RetryableSendError(str(e)) from e
+
+
+class FakeSender:
+    """
+    Reemplazo local de Twilio para pruebas y benchmarks: guarda los mensajes
+    enviados y puede simular latencia o fallos transitorios.
+    """
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.latency = latency
+        self.failures = failures
+        self.sent: List[Tuple[str, str, str]] = []
+        self._lock = threading.Lock()
+
+    def send(self, from_: str, to: str, body: str) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise RetryableSendError("fallo simulado")
+            self.sent.append((from_, to, body))
+
+
+class ReplyDispatcher:
+    """
+    Cola acotada y pool de hilos que arman la respuesta fuera del webhook y la
+    envían por la API de mensajes, con reintentos y backoff exponencial.
+
+    Cada número de WhatsApp va siempre al mismo hilo, así sus mensajes se
+    responden en orden (p. ej. la lista de opciones antes de la elección).
+    Los hilos se crean al primer uso en cada proceso, también tras un fork.
+    """
+
+    def __init__(
+        self,
+        sender,
+        workers: int = REPLY_WORKERS,
+        queue_size: int = REPLY_QUEUE_SIZE,
+        max_retries: int = REPLY_MAX_RETRIES,
+        backoff: float = REPLY_BACKOFF_SECONDS,
+    ):
+        self.sender = sender
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queues: List[queue.Queue] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def reiniciar_tras_fork(self) -> None:
+        # Las colas y sus hilos son del padre: se vuelven a crear al primer uso
+        self._lock = threading.Lock()
+        self._queues = []
+        self._pid = None
+        reiniciar = getattr(self.sender, "reiniciar_tras_fork", None)
+        if reiniciar is not None:
+            reiniciar()
+
+    def _ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            per_worker = max(1, self.queue_size // self.workers)
+            self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+            for i, q in enumerate(self._queues):
+                threading.Thread(target=self._loop, args=(q,), name=f"reply-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, to: str, from_: str, compute: Callable[[], str]) -> bool:
+        """
+        Encola el trabajo; devuelve False si la cola está llena para que el
+        webhook responda en línea.
+        """
+        self._ensure_started()
+        q = self._queues[zlib.crc32(to.encode("utf-8")) % self.workers]
+        try:
+            q.put_nowait((to, from_, compute, time.monotonic()))
+        except queue.Full:
+            metrics.inc("reply_delivery_total", result="queue_full")
+            return False
+        return True
+
+    def drain(self) -> None:
+        # Espera a que se procesen los trabajos encolados (pruebas y apagado ordenado)
+        for q in self._queues:
+            q.join()
+
+    def _loop(self, q: queue.Queue) -> None:
+        while True:
+            to, from_, compute, enqueued = q.get()
+            try:
+                metrics.observe("reply_queue_seconds", time.monotonic() - enqueued)
+                try:
+                    body = compute()
+                except Exception as e:
+                    logger.error(f"Error armando la respuesta para {to}: {e}", exc_info=True)
+                    body = "Ocurrió un error procesando tu consulta. Por favor intenta de nuevo."
+                self._deliver(to, from_, body)
+            finally:
+                q.task_done()
+
+    def _deliver(self, to: str, from_: str, body: str) -> None:
+        for attempt in range(self.max_retries + 1):
+            start = time.monotonic()
+            try:
+                self.sender.send(from_, to, body)
+                metrics.observe("upstream_call_seconds", time.monotonic() - start, upstream="twilio", outcome="ok")
+                metrics.inc("reply_delivery_total", result="sent")
+                return
+            except RetryableSendError as e:
+                metrics.observe("upstream_call_seconds", time.monotonic() - start, upstream="twilio", outcome="error")
+                if attempt == self.max_retries:
+                    logger.error(f"No se pudo enviar la respuesta a {to} tras {attempt + 1} intentos: {e}")
+                    break
+                metrics.inc("reply_delivery_total", result="retried")
+                # Backoff exponencial con jitter para no reintentar todos a la vez
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+            except Exception as e:
+                logger.error(f"Error no recuperable enviando la respuesta a {to}: {e}")
+                break
+        metrics.inc("reply_delivery_total", result="failed")
+
+
+def crear_sender(kind: str = REPLY_SENDER):
+    if kind == "fake":
+        return FakeSender()
+    return TwilioSender()
+
+
+reply_dispatcher = ReplyDispatcher(crear_sender())
+os.register_at_fork(after_in_child=reply_dispatcher.reiniciar_tras_fork)
+
+
+def remitente(to_number: str) -> str:
+    # Se responde desde el número configurado o desde el que recibió el mensaje
+    return TWILIO_WHATSAPP_FROM or to_number
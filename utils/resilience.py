@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+from typing import Optional
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class BudgetExhaustedError(Exception):
+    pass
+
+
+class LatencyBudget:
+    """
+    Tiempo total disponible para responder un webhook.
+    """
+
+    def __init__(self, total: float):
+        self.total = total
+        self.started = time.monotonic()
+
+    def remaining(self) -> float:
+        return max(0.0, self.total - (time.monotonic() - self.started))
+
+    def timeout_for(self, limit: float) -> float:
+        # Timeout de una llamada: el menor entre su límite y lo que queda del presupuesto
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise BudgetExhaustedError("Presupuesto de latencia agotado")
+        return min(limit, remaining)
+
+
+class CircuitBreaker:
+    """
+    Corta las llamadas a un servicio tras varios fallos o respuestas lentas
+    seguidas. Pasado `reset_timeout` deja pasar una llamada de prueba
+    (half-open): si sale bien se cierra, si falla vuelve a abrirse.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_seconds: float, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def check(self) -> None:
+        if not self.allow():
+            metrics.inc("circuit_rejected_total", circuit=self.name)
+            raise CircuitOpenError(f"Circuito {self.name} abierto")
+
+    def reiniciar_tras_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._probing = False
+
+    def release(self) -> None:
+        # La llamada autorizada por check() no llegó al servicio: se libera el turno de prueba sin contar un fallo
+        with self._lock:
+            self._probing = False
+
+    def record(self, latency: float, ok: bool = True) -> None:
+        metrics.observe("upstream_call_seconds", latency, upstream=self.name, outcome="ok" if ok else "error")
+        slow = latency > self.slow_call_seconds
+        with self._lock:
+            self._probing = False
+            if ok and not slow:
+                if self._opened_at is not None:
+                    logger.info(f"Circuito {self.name} cerrado")
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuito {self.name} abierto tras {self._failures} fallos o llamadas lentas")
+                    metrics.inc("circuit_opened_total", circuit=self.name)
+                self._opened_at = time.monotonic()
@@ -0,0 +1,157 @@
+import string
+import logging
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_FORMATTER = string.Formatter()
+
+# Límite de caracteres de un mensaje de WhatsApp por Twilio
+MAX_CARACTERES_MENSAJE = 1600
+
+
+def formatear_pesos(valor: int) -> str:
+    # Los precios del snapshot ya son enteros: se formatean sin volver a limpiar el texto
+    return f"${valor:,}".replace(",", ".")
+
+
+class Plantilla:
+    """
+    Plantilla de respuesta compilada una sola vez: el texto se separa en
+    literales y campos, y los campos con formato `:pesos` se formatean como
+    moneda a partir de enteros.
+    """
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        self.partes: List[Tuple[str, str, bool]] = []
+        for literal, campo, spec, _ in _FORMATTER.parse(texto):
+            if spec and spec != "pesos":
+                raise ValueError(f"Formato no soportado en la plantilla: {{{campo}:{spec}}}")
+            self.partes.append((literal, campo or "", spec == "pesos"))
+        self.campos = {campo for _, campo, _ in self.partes if campo}
+
+    def render(self, valores: Dict) -> str:
+        salida = []
+        for literal, campo, pesos in self.partes:
+            salida.append(literal)
+            if campo:
+                valor = valores[campo]
+                salida.append(formatear_pesos(valor) if pesos else str(valor))
+        return "".join(salida)
+
+
+PLANTILLAS: Dict[str, Plantilla] = {}
+# Cambia cada vez que se registra una plantilla, e invalida las respuestas memorizadas
+_generacion = 0
+
+
+def registrar_plantilla(nombre: str, texto: str) -> None:
+    global _generacion
+    PLANTILLAS[nombre] = Plantilla(texto)
+    _generacion += 1
+
+
+def render(nombre: str, **valores) -> str:
+    return PLANTILLAS[nombre].render(valores)
+
+
+registrar_plantilla(
+    "recompra",
+    "📱 {celular}\n\n"
+    "📊 Información para RECOMPRA 📊\n\n"
+    "Precio de Venta: {venta:pesos}\n"
+    "Inicial Financiera ({porcentaje_inicial}%): {inicial_financiera:pesos}\n"
+    "Inicial real: {inicial_real:pesos}",
+)
+registrar_plantilla(
+    "inicial",
+    "📱 {celular}\n"
+    "📊 Información para {financiera} 📊\n\n"
+    "Precio de Venta: {venta:pesos}\n"
+    "Inicial Financiera ({porcentaje_inicial}%): {inicial_financiera:pesos}\n"
+    "Inicial real: {inicial_real:pesos}",
+)
+registrar_plantilla(
+    "contado",
+    "📱 {celular}\n\n"
+    "💰 PRECIO DE CONTADO 💰\n\n"
+    "💵 Total Contado: {total:pesos}",
+)
+registrar_plantilla(
+    "generica",
+    "📱 {celular}\n\n"
+    "📊 Información para {financiera} 📊\n\n"
+    "💰 Total: {total:pesos}",
+)
+registrar_plantilla(
+    "opciones",
+    "📱 Encontramos opciones similares para {financiera}:\n\n"
+    "{opciones}\n"
+    "Por favor responde con el número de la opción que deseas consultar.",
+)
+registrar_plantilla(
+    "otra_hoja_opciones",
+    "No encontramos '{modelo}' para {financiera}, pero tenemos:\n\n"
+    "{opciones}\n"
+    "¿Deseas consultar alguna de estas opciones?",
+)
+registrar_plantilla(
+    "otra_hoja",
+    "No encontramos '{modelo}' para {financiera}.\n\n"
+    "Pero tenemos este modelo para {otra}:\n"
+    "📱 {celular}",
+)
+registrar_plantilla(
+    "no_encontrado",
+    "No se encontró información para: {modelo}\n\n"
+    "Sugerencias:\n"
+    "- Verifica la ortografía del modelo\n"
+    "- Intenta usar el formato completo (ej: SAMSUNG A 35 128GB)\n"
+    "- Consulta los modelos disponibles con 'lista de modelos'",
+)
+registrar_plantilla(
+    "comparativo",
+    "📊 Comparativo de precios 📊\n\n"
+    "{bloques}\n\n"
+    "{nota}"
+    "Para ver el detalle escribe: 'precios por [financiera] de [modelo]'",
+)
+registrar_plantilla("comparativo_modelo", "📱 {celular}")
+registrar_plantilla("comparativo_no_encontrado", "❌ {modelo}: no encontrado")
+registrar_plantilla("resumen_no_disponible", "• {financiera}: no disponible")
+registrar_plantilla(
+    "resumen_inicial",
+    "• {financiera}: venta {venta:pesos}, inicial {inicial_financiera:pesos} ({porcentaje_inicial}%)",
+)
+registrar_plantilla("resumen_total", "• {financiera}: {total:pesos}")
+registrar_plantilla("lista_titulo", "📋 Lista de precios {financiera} (parte {pagina})\n\n")
+registrar_plantilla("lista_titulo_modelos", "📋 Lista de modelos (parte {pagina})\n\n")
+registrar_plantilla("lista_modelo", "• {celular}")
+registrar_plantilla("lista_siguiente", "\n\nPara ver más escribe: '{comando}'")
+registrar_plantilla("lista_vacia", "No encontramos modelos para '{filtro}'.")
+registrar_plantilla("lista_fin", "La lista tiene {paginas} partes; no hay parte {pagina}.")
+
+
+def respuesta_fila(row, financiera: str, construir: Callable[[], str]) -> str:
+    """
+    Respuesta de precios de una fila memorizada en la propia fila. Cada
+    snapshot tiene sus propias filas, así que la memoria queda asociada a
+    (versión del catálogo, fila, financiera) y se libera con ella.
+    """
+    memo = row.respuestas
+    key = (financiera, _generacion)
+    if memo is not None:
+        cached = memo.get(key)
+        if cached is not None:
+            return cached
+    else:
+        memo = row.respuestas = {}
+
+    texto = construir()
+    memo[key] = texto
+    return texto
+
+
+def lista_opciones(options) -> str:
+    return "".join(f"{i}. {option.celular}\n" for i, option in enumerate(options, 1))
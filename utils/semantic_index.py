@@ -0,0 +1,211 @@
+"""
+Búsqueda semántica de modelos: cada CELULAR del snapshot se convierte en un
+vector una sola vez y las consultas se responden con similitud coseno en
+NumPy (producto matriz-vector y top-k con argpartition), sin llamar a un LLM.
+
+El embedder es intercambiable (SEMANTIC_EMBEDDER): `ngram` es local y sin
+red (TF-IDF de palabras y n-gramas de caracteres con hashing); `openai` usa
+la API de embeddings.
+"""
+import re
+import time
+import zlib
+import logging
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config.settings import (
+    SEMANTIC_EMBEDDER,
+    SEMANTIC_DIMENSIONS,
+    SEMANTIC_MIN_SCORE,
+    SEMANTIC_OPENAI_MODEL,
+    AI_CALL_TIMEOUT_SECONDS,
+)
+from utils.catalog_index import normalizar_modelo
+
+logger = logging.getLogger(__name__)
+
+# Parámetros del ranking: un único candidato muy similar y separado del
+# segundo se trata como coincidencia exacta
+CONFIDENT_SCORE = 0.9
+CONFIDENT_MARGIN = 0.05
+
+# nombre -> fábrica de embedders (uno nuevo por snapshot)
+EMBEDDERS: Dict[str, Callable] = {}
+
+# Letras y números por separado: "128GB/6RAM" -> 128 GB 6 RAM
+_PALABRAS = re.compile(r"[A-Z]+|\d+")
+# Palabras de relleno de las consultas en lenguaje natural
+_RELLENO = {"EL", "LA", "LOS", "UN", "UNO", "UNA", "DE", "DEL", "CON", "Y", "EN", "QUE", "NORMAL", "CELULAR", "TELEFONO", "EQUIPO"}
+
+
+def registrar_embedder(nombre: str):
+    def decorator(cls):
+        EMBEDDERS[nombre] = cls
+        return cls
+    return decorator
+
+
+def palabras(texto: str) -> List[str]:
+    return [p for p in _PALABRAS.findall(normalizar_modelo(texto)) if p not in _RELLENO]
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+@registrar_embedder("ngram")
+class NgramEmbedder:
+    """
+    TF-IDF local: palabras completas (con más peso) y trigramas de caracteres
+    de cada palabra, llevados a `dimensiones` posiciones con hashing. El IDF
+    se ajusta con los modelos del catálogo.
+    """
+
+    def __init__(self, dimensiones: int = SEMANTIC_DIMENSIONS):
+        self.dimensiones = dimensiones
+        self.idf = np.ones(dimensiones, dtype=np.float32)
+        self.clave = f"ngram:{dimensiones}"
+
+    def _rasgos(self, texto: str) -> Counter:
+        rasgos: Counter = Counter()
+        for palabra in palabras(texto):
+            rasgos[zlib.crc32(b"w" + palabra.encode()) % self.dimensiones] += 2
+            marcada = f"#{palabra}#"
+            for i in range(len(marcada) - 2):
+                rasgos[zlib.crc32(marcada[i:i + 3].encode()) % self.dimensiones] += 1
+        return rasgos
+
+    def _conteos(self, textos: Sequence[str]) -> np.ndarray:
+        matriz = np.zeros((len(textos), self.dimensiones), dtype=np.float32)
+        for fila, texto in enumerate(textos):
+            for posicion, conteo in self._rasgos(texto).items():
+                matriz[fila, posicion] = conteo
+        return matriz
+
+    def fit(self, textos: Sequence[str]) -> np.ndarray:
+        conteos = self._conteos(textos)
+        documentos = np.count_nonzero(conteos, axis=0)
+        self.idf = (np.log((1 + len(textos)) / (1 + documentos)) + 1).astype(np.float32)
+        return _normalizar_filas(conteos * self.idf)
+
+    def embed(self, textos: Sequence[str]) -> np.ndarray:
+        return _normalizar_filas(self._conteos(textos) * self.idf)
+
+    def embed_consulta(self, textos: Sequence[str], timeout: Optional[float] = None) -> np.ndarray:
+        return self.embed(textos)
+
+
+@registrar_embedder("openai")
+class OpenAIEmbedder:
+    """
+    Embeddings de la API de OpenAI. El catálogo se vectoriza por lotes al
+    cargar el snapshot; cada consulta es una llamada a la API que pasa por el
+    circuit breaker de OpenAI y usa el timeout que le deja el webhook.
+    """
+
+    LOTE = 1000
+
+    def __init__(self, model: str = SEMANTIC_OPENAI_MODEL, timeout: float = AI_CALL_TIMEOUT_SECONDS):
+        self.model = model
+        self.timeout = timeout
+        self.clave = f"openai:{model}"
+
+    def _crear(self, textos: Sequence[str], timeout: float) -> np.ndarray:
+        from opneai_integrations import cliente_openai
+
+        respuesta = cliente_openai().Embedding.create(model=self.model, input=list(textos), request_timeout=timeout)
+        return np.asarray([item["embedding"] for item in respuesta["data"]], dtype=np.float32)
+
+    def embed(self, textos: Sequence[str]) -> np.ndarray:
+        partes = [self._crear(textos[inicio:inicio + self.LOTE], self.timeout) for inicio in range(0, len(textos), self.LOTE)]
+        return _normalizar_filas(np.concatenate(partes))
+
+    def embed_consulta(self, textos: Sequence[str], timeout: Optional[float] = None) -> np.ndarray:
+        from opneai_integrations import openai_breaker
+
+        openai_breaker.check()
+        start = time.monotonic()
+        try:
+            vectores = self._crear(textos, min(timeout, self.timeout) if timeout else self.timeout)
+        except Exception:
+            openai_breaker.record(time.monotonic() - start, ok=False)
+            raise
+        openai_breaker.record(time.monotonic() - start)
+        return _normalizar_filas(vectores)
+
+    def fit(self, textos: Sequence[str]) -> np.ndarray:
+        return self.embed(textos)
+
+
+def crear_embedder(nombre: str = SEMANTIC_EMBEDDER):
+    if nombre not in EMBEDDERS:
+        raise ValueError(f"Embedder desconocido: {nombre}")
+    return EMBEDDERS[nombre]()
+
+
+def clave_embedder(nombre: str = SEMANTIC_EMBEDDER) -> str:
+    # Identifica el espacio de los vectores: embedder y dimensiones o modelo
+    return crear_embedder(nombre).clave
+
+
+class SemanticIndex:
+    """
+    Matriz de vectores normalizados de los modelos de una hoja. Se construye
+    una vez por snapshot y se guarda con él en la copia local, junto con la
+    clave del embedder que la generó.
+    """
+
+    def __init__(self, models: List[str], embedder=None):
+        self.embedder = embedder or crear_embedder()
+        self.clave = self.embedder.clave
+        self.matriz = self.embedder.fit(models) if models else np.zeros((0, 1), dtype=np.float32)
+
+    def buscar_lote(
+        self, consultas: Sequence[str], k: int = 5, timeout: Optional[float] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k (id de fila, similitud coseno) de varias consultas con un solo
+        producto de matrices. `timeout` limita la llamada del embedder si es
+        remoto.
+        """
+        n = self.matriz.shape[0]
+        if not n or not consultas:
+            return [[] for _ in consultas]
+        k = min(k, n)
+        puntajes = self.embedder.embed_consulta(consultas, timeout) @ self.matriz.T
+        mejores = np.argpartition(-puntajes, k - 1, axis=1)[:, :k]
+        resultados = []
+        for fila, ids in zip(puntajes, mejores):
+            # argpartition no ordena: se ordenan solo los k elegidos (empate: orden de la hoja)
+            orden = sorted(ids.tolist(), key=lambda row_id: (-fila[row_id], row_id))
+            resultados.append([(row_id, float(fila[row_id])) for row_id in orden])
+        return resultados
+
+    def buscar(self, consulta: str, k: int = 5, timeout: Optional[float] = None) -> List[Tuple[int, float]]:
+        return self.buscar_lote([consulta], k, timeout)[0]
+
+    def buscar_normalizado(
+        self, busqueda: str, limit: int = 5, timeout: Optional[float] = None
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Misma forma que CatalogIndex.buscar_normalizado: (exactos, aproximados).
+        """
+        ranked = [item for item in self.buscar(busqueda, limit + 1, timeout) if item[1] >= SEMANTIC_MIN_SCORE]
+        if not ranked:
+            return [], []
+        segundo = ranked[1][1] if len(ranked) > 1 else 0.0
+        if ranked[0][1] >= CONFIDENT_SCORE and ranked[0][1] - segundo >= CONFIDENT_MARGIN:
+            return [ranked[0][0]], []
+        return [], [row_id for row_id, _ in ranked[:limit]]
+
+
+def construir_indice(models: List[str]):
+    # Un fallo del embedder (p. ej. la API de OpenAI) deja la hoja con la búsqueda aproximada
+    try:
+        return SemanticIndex(models)
+    except Exception as e:
+        logger.error(f"No se pudo construir el índice semántico: {e}")
+        return None
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from config.settings import (
+    GOOGLE_SHEETS_CREDENTIALS,
+    SPREADSHEET_NAME,
+    SPREADSHEET_ID,
+    SCOPES,
+    SHEETS_POOL_SIZE,
+    SHEETS_TIMEOUT_SECONDS,
+    SHEETS_TOKEN_REFRESH_MARGIN,
+    CATALOG_CHANGE_SIGNAL,
+    CATALOG_VERSION_RANGE,
+)
+
+if TYPE_CHECKING:
+    import gspread
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2.service_account import Credentials
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsClientManager:
+    """
+    Cliente de Google Sheets de larga vida.
+
+    Lee las credenciales una sola vez, reutiliza una sesión HTTP con pool de
+    conexiones, guarda el spreadsheet abierto y renueva el
+    token en segundo plano antes de que venza para que ningún webhook pague
+    la autenticación en línea. gspread y google-auth se importan al crear el
+    cliente, no al importar el módulo.
+    """
+
+    def __init__(
+        self,
+        credentials_file: str = GOOGLE_SHEETS_CREDENTIALS,
+        scopes: List[str] = SCOPES,
+        spreadsheet_name: str = SPREADSHEET_NAME,
+        spreadsheet_id: Optional[str] = SPREADSHEET_ID,
+        pool_size: int = SHEETS_POOL_SIZE,
+        timeout: float = SHEETS_TIMEOUT_SECONDS,
+        refresh_margin: float = SHEETS_TOKEN_REFRESH_MARGIN,
+    ):
+        self.credentials_file = credentials_file
+        self.scopes = scopes
+        self.spreadsheet_name = spreadsheet_name
+        self.spreadsheet_id = spreadsheet_id
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+
+        self._lock = threading.RLock()
+        self._credentials: Optional["Credentials"] = None
+        self._session: Optional["AuthorizedSession"] = None
+        self._client: Optional["gspread.Client"] = None
+        self._spreadsheet: Optional["gspread.Spreadsheet"] = None
+        self._refresher: Optional[threading.Thread] = None
+        self._last_error: Optional[str] = None
+
+    def client(self) -> "gspread.Client":
+        with self._lock:
+            if self._client is None:
+                import gspread
+                from google.auth.transport.requests import AuthorizedSession
+                from google.oauth2.service_account import Credentials
+                from requests.adapters import HTTPAdapter
+
+                self._credentials = Credentials.from_service_account_file(
+                    self.credentials_file, scopes=self.scopes
+                )
+                session = AuthorizedSession(self._credentials)
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                self._session = session
+                self.ensure_token()
+
+                self._client = gspread.authorize(None, session=session)
+                self._client.set_timeout(self.timeout)
+                self._start_refresher()
+            return self._client
+
+    def spreadsheet(self) -> "gspread.Spreadsheet":
+        with self._lock:
+            if self._spreadsheet is None:
+                client = self.client()
+                # Abrir por ID evita la búsqueda en Drive que hace open() por nombre
+                if self.spreadsheet_id:
+                    self._spreadsheet = client.open_by_key(self.spreadsheet_id)
+                else:
+                    self._spreadsheet = client.open(self.spreadsheet_name)
+            return self._spreadsheet
+
+    def leer_hojas(self, worksheet_names: List[str]) -> Dict[str, List[List[str]]]:
+        """
+        Descarga los valores de varias hojas en una sola llamada (values:batchGet).
+        """
+        try:
+            spreadsheet = self.spreadsheet()
+            ranges = [f"'{name}'" for name in worksheet_names]
+            response = spreadsheet.values_batch_get(ranges)
+            values = {
+                name: value_range.get("values", [])
+                for name, value_range in zip(worksheet_names, response.get("valueRanges", []))
+            }
+            self._last_error = None
+            return values
+        except Exception as e:
+            self._last_error = str(e)
+            self.reset()
+            raise
+
+    def firma_cambios(self) -> Optional[str]:
+        """
+        Señal barata de que el catálogo cambió: el modifiedTime del archivo en
+        Drive o el valor de una celda de versión. None si no hay señal.
+        """
+        if CATALOG_CHANGE_SIGNAL == "drive":
+            return self.spreadsheet().get_lastUpdateTime()
+        if CATALOG_CHANGE_SIGNAL == "cell" and CATALOG_VERSION_RANGE:
+            return json.dumps(self.spreadsheet().values_get(CATALOG_VERSION_RANGE).get("values", []))
+        return None
+
+    def ensure_token(self) -> None:
+        # Renueva el token si ya venció o está por vencer
+        with self._lock:
+            credentials = self._credentials
+            if credentials is None:
+                return
+            if credentials.valid and self.token_expires_in() > self.refresh_margin:
+                return
+            from google.auth.transport.requests import Request
+
+            credentials.refresh(Request(self._session))
+            logger.info("Token de Google Sheets renovado")
+
+    def token_expires_in(self) -> float:
+        credentials = self._credentials
+        if credentials is None or credentials.expiry is None:
+            return 0.0
+        expiry = credentials.expiry.replace(tzinfo=timezone.utc)
+        return (expiry - datetime.now(timezone.utc)).total_seconds()
+
+    def reset(self) -> None:
+        # Descarta los handles cacheados (p. ej. si la hoja se renombró); la sesión se conserva
+        with self._lock:
+            self._spreadsheet = None
+
+    def reiniciar_tras_fork(self) -> None:
+        # La sesión y sus sockets son del padre: el hijo vuelve a autorizar si llega a necesitarlo
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._session = None
+        self._client = None
+        self._spreadsheet = None
+        self._refresher = None
+
+    def health(self) -> Dict:
+        return {
+            "authorized": self._client is not None,
+            "token_expires_in": round(self.token_expires_in()),
+            "spreadsheet_open": self._spreadsheet is not None,
+            "last_error": self._last_error,
+        }
+
+    def _start_refresher(self) -> None:
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            wait = max(self.token_expires_in() - self.refresh_margin, 30)
+            time.sleep(wait)
+            try:
+                self.ensure_token()
+                self._last_error = None
+            except Exception as e:
+                self._last_error = str(e)
+                logger.error(f"Error renovando el token de Google Sheets: {e}")
+
+
+sheets_client = SheetsClientManager()
+os.register_at_fork(after_in_child=sheets_client.reiniciar_tras_fork)
@@ -0,0 +1,137 @@
+"""
+Arranque en fases. El proceso responde GET /livez apenas se importa y
+GET /readyz solo cuando terminó el calentamiento:
+
+1. validar la configuración (config.settings.validar_configuracion);
+2. cargar el catálogo (copia local o Google Sheets);
+3. importar los SDKs que se van a usar (twilio, y openai con AI_ENABLED);
+4. resolver una consulta de prueba para llenar índices y cachés.
+
+Con gunicorn el master calienta antes de crear los workers (gunicorn.conf.py);
+con uvicorn o `python bot.py` el calentamiento corre en un hilo al arrancar.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+from config.settings import AI_ENABLED, REPLY_MODE, VALORES_WORKSHEET, validar_configuracion
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Arranque:
+    def __init__(self):
+        self.fase = "iniciando"
+        self.problemas: List[str] = []
+        self.pasos: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.duracion: Optional[float] = None
+        self._inicio = time.monotonic()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def reiniciar_tras_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def _paso(self, nombre: str, fn: Callable) -> None:
+        start = time.monotonic()
+        fn()
+        self.pasos[nombre] = round(time.monotonic() - start, 3)
+
+    def calentar(self) -> bool:
+        """
+        Ejecuta el calentamiento en el hilo actual; si otro hilo ya lo está
+        haciendo, espera a que termine. Devuelve True si el proceso quedó listo.
+        """
+        with self._lock:
+            if self.fase == "listo":
+                return True
+            self.fase = "calentando"
+            self.error = None
+            start = time.monotonic()
+            try:
+                self._paso("configuracion", self._validar)
+                self._paso("catalogo", self._cargar_catalogo)
+                self._paso("sdks", self._importar_sdks)
+                self._paso("consulta", self._consulta_de_prueba)
+            except Exception as e:
+                self.fase = "error"
+                self.error = str(e)
+                logger.error(f"Calentamiento fallido: {e}")
+                return False
+            self.fase = "listo"
+            self.duracion = round(time.monotonic() - start, 3)
+            metrics.gauge("startup_seconds", round(time.monotonic() - self._inicio, 3))
+            logger.info(f"Servicio listo en {self.duracion}s: {self.pasos}")
+            return True
+
+    def iniciar(self) -> None:
+        """
+        Lanza el calentamiento en segundo plano una vez por proceso (y de nuevo
+        si falló, p. ej. cuando lo pide un probe de readiness).
+        """
+        if self.fase == "listo" or (self.fase == "calentando" and self._pid == os.getpid()):
+            return
+        self._pid = os.getpid()
+        self.fase = "calentando"
+        threading.Thread(target=self.calentar, name="warmup", daemon=True).start()
+
+    def listo(self) -> bool:
+        from utils.utils_methods import catalog_cache
+
+        return self.fase == "listo" and catalog_cache.peek() is not None
+
+    def estado(self) -> Dict:
+        return {
+            "ready": self.listo(),
+            "phase": self.fase,
+            "warmup_seconds": self.duracion,
+            "steps": self.pasos,
+            "error": self.error,
+            "config_problems": self.problemas,
+        }
+
+    def _validar(self) -> None:
+        # Los problemas se informan pero no detienen el arranque: puede haber copia local del catálogo
+        self.problemas = validar_configuracion()
+        for problema in self.problemas:
+            logger.warning(f"Configuración: {problema}")
+
+    def _cargar_catalogo(self) -> None:
+        from utils.utils_methods import catalog_cache
+
+        if catalog_cache.get() is None:
+            raise RuntimeError("no se pudo cargar el catálogo")
+
+    def _importar_sdks(self) -> None:
+        from twilio.twiml.messaging_response import MessagingResponse  # noqa: F401
+
+        if AI_ENABLED:
+            from opneai_integrations import cliente_openai
+
+            cliente_openai()
+        if REPLY_MODE == "async":
+            from utils.reply_delivery import reply_dispatcher
+
+            client = getattr(reply_dispatcher.sender, "client", None)
+            if client is not None:
+                client()
+
+    def _consulta_de_prueba(self) -> None:
+        from utils.message_parser import parse_user_message
+        from utils.utils_methods import buscar_en_catalogo, catalog_cache, cotizar
+
+        catalog = catalog_cache.peek()
+        sheet = catalog.sheet(VALORES_WORKSHEET) if catalog else None
+        if not sheet or not sheet.rows:
+            return
+        financiera, modelo = parse_user_message(f"precios por krediya de {sheet.rows[0].celular}")
+        lookup = buscar_en_catalogo(catalog, VALORES_WORKSHEET, modelo)
+        if lookup.primary is not None and not isinstance(lookup.primary, dict):
+            cotizar(sheet, lookup.primary, financiera)
+
+
+arranque = Arranque()
+os.register_at_fork(after_in_child=arranque.reiniciar_tras_fork)
@@ -1,13 +1,27 @@
-import re
-import gspread
+import os
+import json
+import time
+import hashlib
 import logging
-from oauth2client.service_account import ServiceAccountCredentials
-from typing import Optional, Dict, Union
+import threading
+from typing import Optional, Dict, List, Union
+from utils.async_io import run_blocking
+from utils.catalog_index import CatalogIndex, normalizar_modelo
+from utils.catalog_store import CatalogStore
+from utils.pricing import PRICE_COLUMNS, motor_precios
+from utils.resilience import LatencyBudget
+from utils.responses import MAX_CARACTERES_MENSAJE, render, respuesta_fila
+from utils.message_parser import MAX_MODELOS_LOTE, parse_user_message
+from utils.metrics import metrics
+from utils.sheets_client import sheets_client
 from config.settings import (
-    GOOGLE_SHEETS_CREDENTIALS,
-    SPREADSHEET_NAME,
     VALORES_WORKSHEET,
-    SCOPES,
+    RECOMPRA_WORKSHEET,
+    CATALOG_TTL_SECONDS,
+    CATALOG_RETRY_SECONDS,
+    CATALOG_WATCH_SECONDS,
+    SEMANTIC_SEARCH,
+    AI_CALL_TIMEOUT_SECONDS,
 )
 
 # Configuración de logging
@@ -17,128 +31,539 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def init_google_sheets():
+def indice_semantico(models: List[str]):
+    # numpy solo se importa con SEMANTIC_SEARCH activo; si falta, la hoja queda con la búsqueda aproximada
+    if not SEMANTIC_SEARCH:
+        return None
     try:
-        creds = ServiceAccountCredentials.from_json_keyfile_name(
-            GOOGLE_SHEETS_CREDENTIALS, SCOPES
-        )
-        client = gspread.authorize(creds)
-        spreadsheet = client.open(SPREADSHEET_NAME)
-        return spreadsheet
-    except Exception as e:
-        logger.error(f"Error detallado al inicializar Google Sheets: {str(e)}", exc_info=True)
+        from utils.semantic_index import construir_indice
+    except ImportError as e:
+        logger.warning(f"Búsqueda semántica desactivada, no se pudo importar: {e}")
         return None
+    return construir_indice(models)
 
 
-def buscar_celular(spreadsheet, worksheet_name: str, busqueda: str) -> Optional[Union[Dict, str]]:
-    try:
-        worksheet = spreadsheet.worksheet(worksheet_name)
-
-        # Encabezados esperados
-        if worksheet_name == VALORES_WORKSHEET:
-            expected_headers = [
-                "CELULAR",
-                "CODIGO",
-                "VENTA",
-                "INICIAL FINANCIERA",
-                "INICIAL REAL",
-                "DESCUENTO",
-                "PRECIO BASE",
-                "PRECIO ADDI Y SUMAS",
-                "CONTADO",
-            ]
-        else:
-            expected_headers = [
-                "CELULAR",
-                "CODIGO",
-                "VENTA",
-                "INICIAL FINANCIERA",
-                "INICIAL REAL",
-                "DESCUENTO",
-                "PRECIO BASE",
-                "PRECIO ADDI Y SUMAS",
-            ]
-
-        cell_list = worksheet.get_all_values()
-        actual_headers = cell_list[0]
+def indice_semantico_vigente(semantico) -> bool:
+    # Vectores de otro embedder (u otras dimensiones) no se comparan con los de las consultas
+    from utils.semantic_index import clave_embedder
+
+    return getattr(semantico, "clave", None) == clave_embedder()
+
+
+def get_expected_headers(worksheet_name: str) -> List[str]:
+    # Encabezados esperados
+    expected_headers = [
+        "CELULAR",
+        "CODIGO",
+        "VENTA",
+        "INICIAL FINANCIERA",
+        "INICIAL REAL",
+        "DESCUENTO",
+        "PRECIO BASE",
+        "PRECIO ADDI Y SUMAS",
+    ]
+    if worksheet_name == VALORES_WORKSHEET:
+        expected_headers.append("CONTADO")
+    return expected_headers
+
+
+TEXT_COLUMNS = {
+    "CELULAR": "celular",
+    "CODIGO": "codigo",
+    "DESCUENTO": "descuento",
+}
+
+
+class CatalogRow:
+    """
+    Fila compacta del catálogo con los precios ya convertidos a enteros.
+    """
+
+    __slots__ = (
+        "row_id",
+        "celular",
+        "codigo",
+        "descuento",
+        "venta",
+        "inicial_financiera",
+        "inicial_real",
+        "precio_base",
+        "precio_addi_sumas",
+        "contado",
+        "respuestas",
+    )
+
+    def __init__(self, row_id: int, **values):
+        self.row_id = row_id
+        for attr in TEXT_COLUMNS.values():
+            setattr(self, attr, values.get(attr, "0"))
+        for attr in PRICE_COLUMNS.values():
+            setattr(self, attr, values.get(attr, 0))
+        # Respuestas ya renderizadas de esta fila, por financiera (utils.responses)
+        self.respuestas = None
+
+    def __getstate__(self):
+        # Las respuestas memorizadas no se guardan en la copia local del catálogo
+        return {attr: getattr(self, attr) for attr in self.__slots__ if attr != "respuestas"}
+
+    def __setstate__(self, state: Dict) -> None:
+        for attr, value in state.items():
+            setattr(self, attr, value)
+        self.respuestas = None
+
+    def __repr__(self) -> str:
+        return repr(self.as_dict())
+
+    def get(self, header: str, default=None):
+        # Acceso por nombre de columna, como los antiguos registros tipo dict
+        attr = PRICE_COLUMNS.get(header) or TEXT_COLUMNS.get(header)
+        return getattr(self, attr) if attr else default
+
+    def as_dict(self) -> Dict:
+        values = {attr: getattr(self, attr) for attr in TEXT_COLUMNS.values()}
+        values.update({attr: getattr(self, attr) for attr in PRICE_COLUMNS.values()})
+        values["row_id"] = self.row_id
+        return values
+
+
+class SheetSnapshot:
+    """
+    Contenido ya parseado de una hoja (encabezados validados, filas, índice,
+    índice semántico opcional y cotizaciones precalculadas de cada regla de
+    precios).
+    """
+
+    def __init__(self, worksheet_name: str, headers: List[str], rows: List[CatalogRow], fingerprint: str = ""):
+        self.worksheet_name = worksheet_name
+        self.headers = headers
+        self.rows = rows
+        self.fingerprint = fingerprint
+        self.index = CatalogIndex([row.celular for row in rows])
+        self.semantico = indice_semantico([row.celular for row in rows])
+        self.cotizaciones = motor_precios.precalcular(rows)
+
+    def __getstate__(self) -> Dict:
+        # Las cotizaciones dependen de las reglas vigentes: se recalculan al restaurar
+        state = dict(self.__dict__)
+        state.pop("cotizaciones", None)
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self.cotizaciones = motor_precios.precalcular(self.rows)
+        # Los vectores se guardan con el snapshot; solo se calculan si faltan o cambió el embedder
+        if not SEMANTIC_SEARCH:
+            self.semantico = None
+        elif state.get("semantico") is None or not indice_semantico_vigente(state["semantico"]):
+            self.semantico = indice_semantico([row.celular for row in self.rows])
+
+    @staticmethod
+    def fingerprint_values(cell_list: List[List[str]]) -> str:
+        return hashlib.sha1(json.dumps(cell_list, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def from_values(cls, worksheet_name: str, cell_list: List[List[str]]) -> Optional["SheetSnapshot"]:
+        if not cell_list:
+            return None
 
+        actual_headers = cell_list[0]
+        expected_headers = get_expected_headers(worksheet_name)
         if not all(header in actual_headers for header in expected_headers):
+            logger.error(f"Encabezados inválidos en {worksheet_name}: {actual_headers}")
             return None
 
-        records = []
-        for row in cell_list[1:]:
-            record = {}
-            for i, header in enumerate(actual_headers):
-                if i < len(row):
-                    record[header] = row[i] if row[i] != "" else "0"
+        # Posición de cada columna conocida, resuelta una sola vez por hoja
+        text_columns = [
+            (actual_headers.index(header), attr)
+            for header, attr in TEXT_COLUMNS.items()
+            if header in actual_headers
+        ]
+        price_columns = [
+            (actual_headers.index(header), attr)
+            for header, attr in PRICE_COLUMNS.items()
+            if header in actual_headers
+        ]
+
+        rows = []
+        for row_id, row in enumerate(cell_list[1:]):
+            values = {}
+            for i, attr in text_columns:
+                values[attr] = row[i] if i < len(row) and row[i] != "" else "0"
+            for i, attr in price_columns:
+                values[attr] = int(clean_currency(row[i])) if i < len(row) else 0
+            rows.append(CatalogRow(row_id, **values))
+
+        return cls(worksheet_name, actual_headers, rows, cls.fingerprint_values(cell_list))
+
+
+class CatalogSnapshot:
+    """
+    Foto inmutable del catálogo (VALORES y RECOMPRA) en un momento dado.
+    """
+
+    def __init__(self, sheets: Dict[str, SheetSnapshot], version: int, loaded_at: float):
+        self.sheets = sheets
+        self.version = version
+        self.loaded_at = loaded_at
+
+    def sheet(self, worksheet_name: str) -> Optional[SheetSnapshot]:
+        return self.sheets.get(worksheet_name)
+
+    def touch(self) -> "CatalogSnapshot":
+        # Mismo contenido y versión, pero vigente desde ahora
+        return CatalogSnapshot(self.sheets, self.version, time.time())
+
+    def age(self) -> float:
+        return time.time() - self.loaded_at
+
+
+class CatalogCache:
+    """
+    Mantiene el catálogo en memoria y lo refresca en segundo plano.
+
+    Mientras el snapshot esté vigente (TTL) las búsquedas no tocan Google Sheets.
+    Cuando vence se sigue sirviendo el snapshot anterior y se lanza un refresco
+    en un hilo aparte; si Google falla se conserva el último snapshot bueno.
+    Antes de descargar se consulta una señal de cambio barata (modifiedTime de
+    Drive o una celda de versión) y solo se descarga si cambió. Cada catálogo
+    nuevo se guarda en una copia local que se carga al arrancar.
+    """
+
+    def __init__(
+        self,
+        worksheets: List[str],
+        ttl: float = CATALOG_TTL_SECONDS,
+        retry_interval: float = CATALOG_RETRY_SECONDS,
+        loader=sheets_client.leer_hojas,
+        change_signal=sheets_client.firma_cambios,
+        store: Optional[CatalogStore] = None,
+    ):
+        self.worksheets = [name for name in worksheets if name]
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._loader = loader
+        self._change_signal = change_signal
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._last_signal: Optional[str] = None
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._forcing = False
+        self._force_pending = False
+        self._last_attempt = 0.0
+        self._store = store
+        self._following = False
+        self._stamp = None
+        self._restore()
+
+    def _restore(self) -> None:
+        if self._store is None:
+            return
+        snapshot, signal = self._store.load()
+        if snapshot is None:
+            return
+        # Se conserva loaded_at original: si ya venció se sirve y se refresca en segundo plano
+        self._snapshot = snapshot
+        self._last_signal = signal
+        logger.info(f"Catálogo restaurado de la copia local (versión {snapshot.version}, {round(snapshot.age())}s de antigüedad)")
+
+    def follow(self, watch_interval: float = CATALOG_WATCH_SECONDS) -> None:
+        """
+        Modo worker (pre-fork): nunca se llama a Google Sheets. El catálogo
+        heredado del master se comparte copy-on-write; un hilo vigía recarga
+        la copia que publica el refrescador y la cambia de una vez, así que
+        ninguna petición espera a que se lea. Tras recargar, cada worker tiene
+        su propia copia del catálogo (ya no compartida con el master).
+        """
+        if self._following:
+            return
+        self._following = True
+        self._stamp = self._store.last_stamp if self._store else None
+        thread = threading.Thread(target=self._follow_loop, args=(watch_interval,), name="catalog-follow", daemon=True)
+        thread.start()
+
+    def reiniciar_tras_fork(self) -> None:
+        # Un refresco en curso en el padre no sigue en el hijo: si no, nunca volvería a refrescar
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._refreshing = False
+        self._forcing = False
+        self._force_pending = False
+
+    def lead(self, watch_interval: float = CATALOG_WATCH_SECONDS) -> None:
+        # Modo refrescador único: vence el TTL o llega un pedido de un worker y se publica la copia
+        thread = threading.Thread(target=self._lead_loop, args=(watch_interval,), daemon=True)
+        thread.start()
+
+    def _lead_loop(self, watch_interval: float) -> None:
+        while True:
+            time.sleep(watch_interval)
+            try:
+                if self._store is not None and self._store.consume_refresh_request():
+                    self.request_refresh()
+                snapshot = self._snapshot
+                if snapshot is None or snapshot.age() >= self.ttl:
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"Error en el refrescador del catálogo: {e}", exc_info=True)
+
+    def _follow_loop(self, watch_interval: float) -> None:
+        while True:
+            time.sleep(watch_interval)
+            try:
+                self._sync_from_store()
+            except Exception as e:
+                logger.error(f"Error recargando la copia publicada del catálogo: {e}", exc_info=True)
+
+    def _sync_from_store(self) -> None:
+        stamp = self._store.stamp()
+        if stamp is None or stamp == self._stamp:
+            return
+        # Se lee fuera de las peticiones; get() sigue sirviendo el snapshot anterior hasta el cambio
+        snapshot, signal = self._store.load()
+        if snapshot is not None:
+            self._last_signal = signal
+            self._snapshot = snapshot
+            logger.info(f"Catálogo versión {snapshot.version} recargado de la copia publicada")
+            self._stamp = self._store.last_stamp
+        else:
+            self._stamp = stamp
+
+    def peek(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    def get(self) -> Optional[CatalogSnapshot]:
+        if self._following:
+            return self._snapshot
+        snapshot = self._snapshot
+        if snapshot is None:
+            # Primera carga: no hay nada que servir, se carga en línea
+            return self.refresh()
+        if snapshot.age() >= self.ttl:
+            self.refresh_in_background()
+        return snapshot
+
+    def refresh(self, force: bool = False) -> Optional[CatalogSnapshot]:
+        with self._lock:
+            if not force:
+                # Otro hilo pudo haber cargado mientras esperábamos el lock
+                if self._snapshot is not None and self._snapshot.age() < self.ttl:
+                    return self._snapshot
+                if time.time() - self._last_attempt < self.retry_interval:
+                    return self._snapshot
+            self._last_attempt = time.time()
+
+            signal = None
+            if self._change_signal is not None:
+                try:
+                    signal = self._change_signal()
+                except Exception as e:
+                    logger.warning(f"No se pudo consultar la señal de cambios, se descarga todo: {e}")
+
+            if not force and signal is not None and signal == self._last_signal and self._snapshot is not None:
+                self._snapshot = self._snapshot.touch()
+                metrics.inc("catalog_refresh_total", result="unchanged")
+                return self._snapshot
+
+            if self._load():
+                self._last_signal = signal
+                metrics.inc("catalog_refresh_total", result="downloaded")
+                if self._store is not None:
+                    self._store.save(self._snapshot, signal)
+            else:
+                metrics.inc("catalog_refresh_total", result="failed")
+            return self._snapshot
+
+    def refresh_in_background(self) -> None:
+        # Solo se toma el lock de estado: nunca se espera a una carga en curso
+        with self._state_lock:
+            if self._refreshing:
+                return
+            if time.time() - self._last_attempt < self.retry_interval:
+                return
+            self._refreshing = True
+        thread = threading.Thread(target=self._background_refresh, daemon=True)
+        thread.start()
+
+    def request_refresh(self) -> None:
+        """
+        Pide una descarga inmediata (p. ej. desde /catalog/refresh). Varias
+        peticiones seguidas mientras hay una descarga en curso se agrupan en una.
+        """
+        if self._following:
+            self._store.request_refresh()
+            return
+        with self._state_lock:
+            self._force_pending = True
+            if self._forcing:
+                return
+            self._forcing = True
+        thread = threading.Thread(target=self._forced_refresh, daemon=True)
+        thread.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    def _forced_refresh(self) -> None:
+        while True:
+            with self._state_lock:
+                if not self._force_pending:
+                    self._forcing = False
+                    return
+                self._force_pending = False
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                logger.error(f"Error en el refresco forzado del catálogo: {e}", exc_info=True)
+
+    def _load(self) -> bool:
+        try:
+            with metrics.span("sheets_download"):
+                values = self._loader(self.worksheets)
+        except Exception as e:
+            logger.error(f"No se pudo refrescar el catálogo, se mantiene el último snapshot: {e}")
+            return False
+
+        previous = self._snapshot
+        sheets = {}
+        changed = previous is None
+        for worksheet_name in self.worksheets:
+            sheet = None
+            old_sheet = previous.sheet(worksheet_name) if previous else None
+            if worksheet_name in values:
+                cell_list = values[worksheet_name]
+                if old_sheet is not None and old_sheet.fingerprint == SheetSnapshot.fingerprint_values(cell_list):
+                    # Sin cambios: se reutiliza la hoja ya parseada e indexada
+                    sheet = old_sheet
                 else:
-                    record[header] = "0"
-            records.append(record)
-
-        # Normalización mejorada de la búsqueda
-        busqueda = busqueda.upper().strip()
-        
-        # Normalización especial para modelos Samsung (A35 -> A 35)
-        busqueda = re.sub(r"SAMSUNG\s*A\s*(\d+)", r"SAMSUNG A \1", busqueda)
-        busqueda = re.sub(r"SAMSUNG\s*([A-Z]+)\s*(\d+)", r"SAMSUNG \1 \2", busqueda)
-        
-        # Normalización para modelos OPPO
-        busqueda = re.sub(r"OPPO\s*A\s*(\d+)", r"OPPO A\1", busqueda)
-        busqueda = re.sub(r"OPPO\s*([A-Z]+)\s*(\d+)", r"OPPO \1\2", busqueda)
-        
-        # Normalización de memoria
-        busqueda = re.sub(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*GB", r"\1GB/\2GB", busqueda)
-        busqueda = re.sub(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*RAM", r"\1GB/\2RAM", busqueda)
-        busqueda = re.sub(r"(\d+)\s*GB", r"\1GB", busqueda)
-        busqueda = re.sub(r"(\d+)\s*RAM", r"\1RAM", busqueda)
-        busqueda = re.sub(r"\s+", " ", busqueda).strip()
-
-        exact_matches = []
-        partial_matches = []
-
-        for record in records:
-            celular = str(record.get("CELULAR", "")).upper()
-            
-            # Aplicar las mismas normalizaciones al registro
-            celular = re.sub(r"SAMSUNG\s*A\s*(\d+)", r"SAMSUNG A \1", celular)
-            celular = re.sub(r"SAMSUNG\s*([A-Z]+)\s*(\d+)", r"SAMSUNG \1 \2", celular)
-            celular = re.sub(r"OPPO\s*A\s*(\d+)", r"OPPO A\1", celular)
-            celular = re.sub(r"OPPO\s*([A-Z]+)\s*(\d+)", r"OPPO \1\2", celular)
-            celular = re.sub(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*GB", r"\1GB/\2GB", celular)
-            celular = re.sub(r"(\d+)\s*GB\s*[/]?\s*(\d+)\s*RAM", r"\1GB/\2RAM", celular)
-            celular = re.sub(r"(\d+)\s*GB", r"\1GB", celular)
-            celular = re.sub(r"(\d+)\s*RAM", r"\1RAM", celular)
-            celular = re.sub(r"\s+", " ", celular).strip()
-            
-            # Coincidencia exacta (comparación normalizada)
-            if busqueda == celular:
-                exact_matches.append(record)
-                continue
-                
-            # Coincidencia parcial (ignorando números)
-            busqueda_parts = [part for part in re.split(r'\s+|/', busqueda) if part and not part.isdigit()]
-            celular_parts = [part for part in re.split(r'\s+|/', celular) if part and not part.isdigit()]
-            
-            if all(part in celular_parts for part in busqueda_parts):
-                partial_matches.append(record)
-        
-        # Priorizar coincidencias exactas
-        if exact_matches:
-            if len(exact_matches) == 1:
-                return exact_matches[0]
-            return {"multiple_options": exact_matches}
-            
-        # Si no hay exactas pero hay parciales
-        if partial_matches:
-            return {"multiple_options": partial_matches[:5]}  # Limitar a 5 opciones
-            
+                    with metrics.span("sheets_parse"):
+                        sheet = SheetSnapshot.from_values(worksheet_name, cell_list)
+            if sheet is None:
+                sheet = old_sheet
+            if sheet is not None:
+                sheets[worksheet_name] = sheet
+                changed = changed or sheet is not old_sheet
+
+        if not sheets:
+            return False
+
+        # La versión (contador de este proceso) solo cambia si cambió el contenido
+        if previous is None:
+            version = 1
+        else:
+            version = previous.version + 1 if changed else previous.version
+        self._snapshot = CatalogSnapshot(sheets, version, time.time())
+        if changed:
+            logger.info(f"Catálogo cargado (versión {version}): {list(sheets)}")
+        # Si faltó alguna hoja no se da la carga por completa y se reintenta
+        return all(name in values for name in self.worksheets)
+
+
+catalog_cache = CatalogCache([VALORES_WORKSHEET, RECOMPRA_WORKSHEET], store=CatalogStore())
+os.register_at_fork(after_in_child=catalog_cache.reiniciar_tras_fork)
+
+
+def get_catalog() -> Optional[CatalogSnapshot]:
+    return catalog_cache.get()
+
+
+async def get_catalog_async() -> Optional[CatalogSnapshot]:
+    # Con un snapshot cargado get() no bloquea: a lo sumo agenda un refresco
+    if catalog_cache.peek() is not None:
+        return catalog_cache.get()
+    return await run_blocking("sheets", catalog_cache.get)
+
+
+def _resultado_busqueda(
+    sheet: Optional[SheetSnapshot], normalizado: str, budget: Optional[LatencyBudget] = None
+) -> Optional[Union[CatalogRow, Dict]]:
+    if sheet is None:
         return None
 
+    exact_ids, ranked_ids = sheet.index.exact.get(normalizado, []), []
+    if not exact_ids and sheet.semantico is not None:
+        try:
+            # Con el embedder de OpenAI la consulta es una llamada a la API: respeta el presupuesto del webhook
+            timeout = budget.timeout_for(AI_CALL_TIMEOUT_SECONDS) if budget else None
+            with metrics.span("semantic"):
+                exact_ids, ranked_ids = sheet.semantico.buscar_normalizado(normalizado, limit=5, timeout=timeout)
+        except Exception as e:
+            logger.error(f"Búsqueda semántica fallida, se usa la aproximada: {e}")
+    if not exact_ids and not ranked_ids:
+        exact_ids, ranked_ids = sheet.index.buscar_normalizado(normalizado, limit=5)
+
+    # Priorizar coincidencias exactas
+    if exact_ids:
+        if len(exact_ids) == 1:
+            return sheet.rows[exact_ids[0]]
+        return {"multiple_options": [sheet.rows[i] for i in exact_ids]}
+
+    # Si no hay exactas, las aproximadas ya vienen ordenadas por puntaje
+    if ranked_ids:
+        return {"multiple_options": [sheet.rows[i] for i in ranked_ids]}
+
+    return None
+
+
+def buscar_celular(catalog: CatalogSnapshot, worksheet_name: str, busqueda: str) -> Optional[Union[CatalogRow, Dict]]:
+    try:
+        return _resultado_busqueda(catalog.sheet(worksheet_name), normalizar_modelo(busqueda))
     except Exception as e:
         logger.error(f"Error al buscar en {worksheet_name}: {str(e)}", exc_info=True)
         return None
 
 
+def get_other_worksheet(worksheet_name: str) -> str:
+    return VALORES_WORKSHEET if worksheet_name == RECOMPRA_WORKSHEET else RECOMPRA_WORKSHEET
+
+
+class LookupResult:
+    """
+    Resultado de buscar un modelo en la hoja principal y, solo si ahí no
+    aparece, en la otra hoja.
+    """
+
+    def __init__(self, worksheet_name: str, primary, other_worksheet: str, cross):
+        self.worksheet_name = worksheet_name
+        self.primary = primary
+        self.other_worksheet = other_worksheet
+        self.cross = cross
+
+
+def _resultado_metrica(primary, cross) -> str:
+    if isinstance(primary, CatalogRow) or (isinstance(primary, dict) and len(primary["multiple_options"]) == 1):
+        return "exact"
+    if primary:
+        return "partial"
+    # Sin resultados en la hoja pedida: se ofrece lo de la otra hoja
+    return "other_sheet" if cross else "miss"
+
+
+def buscar_en_catalogo(
+    catalog: CatalogSnapshot, worksheet_name: str, busqueda: str, budget: Optional[LatencyBudget] = None
+) -> LookupResult:
+    """
+    Busca el modelo en la hoja pedida; la otra hoja solo se revisa si ahí no
+    aparece.
+    """
+    other_worksheet = get_other_worksheet(worksheet_name)
+    primary, cross = None, None
+    # Un solo span por búsqueda, incluya o no la otra hoja
+    with metrics.span("lookup"):
+        try:
+            normalizado = normalizar_modelo(busqueda)
+            primary = _resultado_busqueda(catalog.sheet(worksheet_name), normalizado, budget)
+            if not primary:
+                cross = _resultado_busqueda(catalog.sheet(other_worksheet), normalizado, budget)
+        except Exception as e:
+            logger.error(f"Error al buscar {busqueda}: {str(e)}", exc_info=True)
+    metrics.inc("lookup_total", result=_resultado_metrica(primary, cross))
+    return LookupResult(worksheet_name, primary, other_worksheet, cross)
+
+
 def clean_currency(value):
     if isinstance(value, str):
         cleaned = value.replace("$", "").replace(".", "").strip()
@@ -151,93 +576,120 @@ def clean_currency(value):
     return 0.0
 
 
-def format_currency(value):
+@metrics.span("format")
+def cotizar(sheet: Optional[SheetSnapshot], row: CatalogRow, financiera: str) -> str:
+    """
+    Respuesta de precios de una fila para una financiera: lee la cotización
+    precalculada del motor de precios y la renderiza con su plantilla.
+    """
+    def construir() -> str:
+        regla = motor_precios.regla(financiera)
+        valores = motor_precios.valores(sheet.cotizaciones if sheet else {}, row, financiera)
+        if valores is None:
+            raise ValueError(f"sin cotización para la fila {row.row_id}")
+        return render(regla.plantilla, **valores)
+
     try:
-        value = clean_currency(value)
-        return "${:,.0f}".format(value).replace(",", ".")
+        return respuesta_fila(row, financiera, construir)
     except Exception as e:
-        logger.error(f"Error al formatear valor: {e}")
-        return str(value)
+        logger.error(f"Error calculando precio para {financiera}: {e}")
+        return f"Error calculando el precio para {financiera}"
 
 
-def procesar_krediya(data: Dict, financiera: str) -> str:
-    try:
-        celular = data.get("CELULAR", "N/A")
-        venta = format_currency(data.get("VENTA", "N/A"))
-        inicial_financiera = format_currency(data.get("INICIAL FINANCIERA", "N/A"))
-        inicial_real = format_currency(data.get("INICIAL REAL", "N/A"))
+@metrics.span("format")
+def resumir(sheet: Optional[SheetSnapshot], row: CatalogRow, financiera: str) -> str:
+    """
+    Línea de comparativo de una fila para una financiera, con la plantilla de
+    resumen de su regla. Se memoriza en la fila igual que cotizar().
+    """
+    def construir() -> str:
+        regla = motor_precios.regla(financiera)
+        valores = motor_precios.valores(sheet.cotizaciones if sheet else {}, row, financiera)
+        if valores is None:
+            raise ValueError(f"sin cotización para la fila {row.row_id}")
+        return render(regla.resumen, **valores)
 
-        # Calcular el porcentaje real
-        try:
-            venta_valor = clean_currency(data.get("VENTA", 0))
-            inicial_financiera_valor = clean_currency(data.get("INICIAL FINANCIERA", 0))
-            porcentaje = (
-                round((inicial_financiera_valor / venta_valor) * 100)
-                if venta_valor != 0
-                else 0
-            )
-        except ZeroDivisionError:
-            porcentaje = 0
-
-        response = (
-            f"📱 {celular}\n"
-            f"📊 Información para {financiera.upper()} 📊\n\n"
-            f"Precio de Venta: {venta}\n"
-            f"Inicial Financiera ({porcentaje}%): {inicial_financiera}\n"
-            f"Inicial real: {inicial_real}"
-        )
-        return response
+    try:
+        return respuesta_fila(row, f"resumen:{financiera}", construir)
     except Exception as e:
-        logger.error(f"Error procesando Krediya: {e}")
-        return "Hubo un error al procesar la información de Krediya."
-
-
-def parse_user_message(message: str) -> tuple:
-    message = message.lower().strip()
-    
-    # Primero detectar si es una consulta de contado
-    if "contado" in message:
-        modelo = re.sub(r"(precios?|precio|info|informaci[oó]n|consulta|por|de|para|contado)", "", message)
-        modelo = re.sub(r"[^a-zA-Z0-9\s]", "", modelo).upper()
-        modelo = re.sub(r"\s+", " ", modelo).strip()
-        return "contado", modelo
-    
-    # Patrón mejorado para extraer financiera y modelo
-    pattern = re.compile(
-        r"(?:precios?|precio|info|informaci[oó]n|consulta)\s*(?:por|de|para)?\s*"
-        r"(krediya|kredi|credia|crediya|adelantos|adelanto|sumas\s*pay|sumaspay|sumas|addi|"
-        r"banco\s*de\s*bogota|bancobogota|bogota|brilla|recompra|re\s*compra)\s*"
-        r"(?:de|del|para|sobre)?\s*(.+)",
-        re.IGNORECASE,
-    )
+        logger.error(f"Error calculando el resumen para {financiera}: {e}")
+        return render("resumen_no_disponible", financiera=financiera.upper())
+
+
+def _mejor_fila(resultado) -> Optional[CatalogRow]:
+    # Coincidencia exacta o, si no la hay, la opción mejor puntuada
+    if isinstance(resultado, CatalogRow):
+        return resultado
+    if resultado:
+        return resultado["multiple_options"][0]
+    return None
+
+
+def _fila_exacta(sheet: Optional[SheetSnapshot], normalizado: str) -> Optional[CatalogRow]:
+    exact_ids = sheet.index.exact.get(normalizado) if sheet else None
+    return sheet.rows[exact_ids[0]] if exact_ids else None
+
+
+def cotizar_lote(catalog: CatalogSnapshot, financieras: List[str], modelos: List[str]) -> str:
+    """
+    Comparativo de varios modelos y/o financieras en un solo mensaje. Cada
+    modelo se busca primero por nombre exacto en todas las hojas pedidas y,
+    si en ninguna está, con la búsqueda completa hoja por hoja; el modelo
+    encontrado se cruza con las demás hojas por nombre exacto. Así el orden
+    de las financieras no cambia el resultado.
+    """
+    hojas = {f: RECOMPRA_WORKSHEET if f == "recompra" else VALORES_WORKSHEET for f in financieras}
+    orden = list(dict.fromkeys(hojas.values()))
+    bloques: List[str] = []
+    largo = 0
+    for modelo in modelos[:MAX_MODELOS_LOTE]:
+        encabezado, origen, resultado = None, None, None
+        with metrics.span("lookup"):
+            try:
+                normalizado = normalizar_modelo(modelo)
+                for hoja in orden:
+                    encabezado = _fila_exacta(catalog.sheet(hoja), normalizado)
+                    if encabezado is not None:
+                        origen, resultado = hoja, encabezado
+                        break
+                else:
+                    for hoja in orden:
+                        resultado = _resultado_busqueda(catalog.sheet(hoja), normalizado)
+                        encabezado = _mejor_fila(resultado)
+                        if encabezado is not None:
+                            origen = hoja
+                            break
+            except Exception as e:
+                logger.error(f"Error al buscar {modelo}: {str(e)}", exc_info=True)
+                encabezado, resultado = None, None
+            filas = {}
+            if encabezado is not None:
+                # En las otras hojas solo cuenta el mismo modelo, no uno parecido
+                exacto = normalizar_modelo(encabezado.celular)
+                filas = {hoja: _fila_exacta(catalog.sheet(hoja), exacto) for hoja in orden if hoja != origen}
+                filas[origen] = encabezado
+        metrics.inc("lookup_total", result=_resultado_metrica(resultado, None))
+
+        if encabezado is None:
+            bloque = render("comparativo_no_encontrado", modelo=modelo)
+        else:
+            lineas = [render("comparativo_modelo", celular=encabezado.celular)]
+            for financiera in financieras:
+                hoja = hojas[financiera]
+                row = filas[hoja]
+                if row is None:
+                    lineas.append(render("resumen_no_disponible", financiera=financiera.upper()))
+                else:
+                    lineas.append(resumir(catalog.sheet(hoja), row, financiera))
+            bloque = "\n".join(lineas)
+
+        # Se corta antes de pasar el límite de un mensaje de WhatsApp
+        if bloques and largo + len(bloque) > MAX_CARACTERES_MENSAJE - 200:
+            break
+        bloques.append(bloque)
+        largo += len(bloque) + 2
 
-    match = pattern.search(message)
-    if match:
-        financiera = match.group(1).lower()
-        modelo = match.group(2).strip()
-
-        financiera_map = {
-            "kredi": "krediya",
-            "credia": "krediya",
-            "crediya": "krediya",
-            "adelanto": "adelantos",
-            "sumaspay": "sumas pay",
-            "sumas": "sumas pay",
-            "bancobogota": "banco de bogota",
-            "bogota": "banco de bogota",
-            "re compra": "recompra",
-        }
-        
-        financiera = financiera_map.get(financiera, financiera)
-
-        modelo = re.sub(r"(precios?|precio|info|informaci[oó]n|consulta|por|de|para)", "", modelo)
-        modelo = re.sub(r"[^a-zA-Z0-9\s]", "", modelo).upper()
-        modelo = re.sub(r"\s+", " ", modelo).strip()
-
-        return financiera, modelo
-
-    modelo = re.sub(r"(precios?|precio|info|informaci[oó]n|consulta|por|de|para)", "", message)
-    modelo = re.sub(r"[^a-zA-Z0-9\s]", "", modelo).upper()
-    modelo = re.sub(r"\s+", " ", modelo).strip()
-    
-    return None, modelo
\ No newline at end of file
+    nota = ""
+    if len(bloques) < len(modelos):
+        nota = f"(Se muestran {len(bloques)} de {len(modelos)} modelos; consulta los demás por separado.)\n\n"
+    return render("comparativo", bloques="\n\n".join(bloques), nota=nota)